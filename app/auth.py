@@ -1,25 +1,41 @@
 """Authentication — simple JWT-based login with a single hardcoded user."""
 
 import os
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
+from sqlalchemy import select, bindparam
 from sqlalchemy.orm import Session
-from .database import get_db
+from .database import get_db, serialized_write
+from .models import User
 
 # ── Config ────────────────────────────────────────────────────────────
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "nc-invoice-secret-key-change-in-production-2024")
 ALGORITHM = "HS256"
+# HMAC key object built once — jose would otherwise re-parse SECRET_KEY on every encode/decode
+_JWT_KEY = jwk.construct(SECRET_KEY.encode(), ALGORITHM)
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours
+BCRYPT_ROUNDS = 10  # single local user — passlib's default 12 makes every login ~4x slower
+TOKEN_CACHE_TTL_SECONDS = 60
+TOKEN_CACHE_MAX_SIZE = 1024
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
+# Verified tokens: raw token -> (username, cache entry expiry as epoch seconds)
+_token_cache: dict = {}
+_token_cache_lock = threading.Lock()
+
+_USER_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+
 
 # ── Schemas ───────────────────────────────────────────────────────────
 class Token(BaseModel):
@@ -33,10 +49,6 @@ class LoginRequest(BaseModel):
 
 
 # ── Helpers ───────────────────────────────────────────────────────────
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
-
-
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -45,19 +57,81 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(to_encode, _JWT_KEY, algorithm=ALGORITHM)
 
 
 def authenticate_user(db: Session, username: str, password: str):
-    from .models import User
-    user = db.query(User).filter(User.username == username).first()
+    user = db.execute(_USER_BY_USERNAME, {"username": username}).scalar_one_or_none()
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    valid, new_hash = pwd_context.verify_and_update(password, user.password_hash)
+    if not valid:
         return False
+    if new_hash:
+        # Transparently re-hash passwords stored with older cost settings
+        _store_password_hash(db, user, new_hash)
     return user
 
 
+@serialized_write
+def _store_password_hash(db: Session, user: User, password_hash: str) -> None:
+    user.password_hash = password_hash
+    db.commit()
+
+
+def _get_cached_username(token: str) -> Optional[str]:
+    """Return the username for an already verified token, if still fresh."""
+    with _token_cache_lock:
+        entry = _token_cache.get(token)
+        if entry is None:
+            return None
+        username, expires_at = entry
+        if expires_at <= time.time():
+            del _token_cache[token]
+            return None
+        return username
+
+
+def _cache_token(token: str, username: str, exp) -> None:
+    """Remember a verified token until its own expiry or the cache TTL, whichever is sooner."""
+    now = time.time()
+    expires_at = now + TOKEN_CACHE_TTL_SECONDS
+    if exp is not None:
+        expires_at = min(expires_at, float(exp))
+    if expires_at <= now:
+        return
+    with _token_cache_lock:
+        if len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+            # Drop the oldest entry (dicts keep insertion order)
+            _token_cache.pop(next(iter(_token_cache)))
+        _token_cache[token] = (username, expires_at)
+
+
+def invalidate_user_tokens(username: str) -> None:
+    """Forget cached tokens of a user (e.g. after a username/password change)."""
+    with _token_cache_lock:
+        for token in [t for t, (u, _) in _token_cache.items() if u == username]:
+            del _token_cache[token]
+
+
+def _verify_token(token: str, db: Session) -> str:
+    """Decode the JWT and make sure its user still exists. Blocking."""
+    try:
+        payload = jwt.decode(token, _JWT_KEY, algorithms=[ALGORITHM])
+        username: str = payload.get("sub")
+        if username is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    user = db.execute(_USER_BY_USERNAME, {"username": username}).scalar_one_or_none()
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    _cache_token(token, user.username, payload.get("exp"))
+    return user.username
+
+
 # ── Dependency ────────────────────────────────────────────────────────
 async def get_current_user(request: Request, token: Optional[str] = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """Checks for JWT token in Authorization header OR in 'token' cookie."""
@@ -70,17 +144,10 @@ async def get_current_user(request: Request, token: Optional[str] = Depends(oaut
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    from .models import User
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
-        
-    return user.username
+
+    cached_username = _get_cached_username(token)
+    if cached_username is not None:
+        return cached_username
+
+    # Signature check + DB lookup are blocking; keep them off the event loop
+    return await run_in_threadpool(_verify_token, token, db)
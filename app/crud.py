@@ -1,14 +1,29 @@
 """CRUD operations for clients, invoices, services, and settings."""
 
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, func, extract
+from sqlalchemy.orm import Session, contains_eager, joinedload, raiseload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import and_, case, or_, func, insert, select, update, bindparam, literal_column, table
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import Optional, List
 from datetime import date as date_type
+import threading
 from . import models, schemas
+from .database import data_version, serialized_write
 from .utils import generate_invoice_number
 
 
+# Hot lookups are built once so SQLAlchemy's compiled-statement cache is hit
+# without rebuilding the query graph on every call
+_CLIENT_BY_ID = select(models.Client).where(models.Client.id == bindparam("id"))
+_SERVICE_BY_ID = select(models.Service).where(models.Service.id == bindparam("id"))
+_INVOICE_BY_ID = (
+    select(models.Invoice)
+    .options(joinedload(models.Invoice.client), joinedload(models.Invoice.items))
+    .where(models.Invoice.id == bindparam("id"))
+)
+_SETTINGS_ROWS = select(models.Settings.key, models.Settings.value)
+
+
 # ── Settings ──────────────────────────────────────────────────────────
 
 SETTINGS_KEYS = [
@@ -24,29 +39,66 @@ SETTINGS_KEYS = [
 ]
 
 
+# Cache of the materialized settings dict, tagged with the database's
+# data_version so commits from other processes (or a replaced database file)
+# are noticed too. In-process writers also bump the generation so a read that
+# raced with a write never stores stale data.
+_settings_cache: Optional[dict] = None
+_settings_cache_version: Optional[int] = None
+_settings_generation = 0
+_settings_lock = threading.Lock()
+
+
+def invalidate_settings_cache():
+    """Drop the cached settings — call after every write to the settings table."""
+    global _settings_cache, _settings_generation
+    with _settings_lock:
+        _settings_cache = None
+        _settings_generation += 1
+
+
 def get_settings(db: Session) -> dict:
-    rows = db.query(models.Settings).all()
+    global _settings_cache, _settings_cache_version
+    version = data_version()
+    with _settings_lock:
+        if _settings_cache is not None and _settings_cache_version == version:
+            return dict(_settings_cache)
+        generation = _settings_generation
+
+    # Plain (key, value) tuples: no ORM instances or identity-map entries
+    rows = db.execute(_SETTINGS_ROWS).all()
     data = {k: "" for k in SETTINGS_KEYS}
     data["vat_enabled"] = "true"  # default
-    for row in rows:
-        if row.key in data:
-            data[row.key] = row.value
-    return data
+    for key, value in rows:
+        if key in data:
+            data[key] = value
 
+    with _settings_lock:
+        if generation == _settings_generation:
+            _settings_cache = data
+            _settings_cache_version = version
+    return dict(data)
 
+
+@serialized_write
 def update_settings(db: Session, data: schemas.SettingsUpdate) -> dict:
     updates = data.model_dump(exclude_unset=True)
-    for key, value in updates.items():
-        stmt = sqlite_insert(models.Settings).values(key=key, value=value or "")
+    if updates:
+        # One multi-row INSERT ... ON CONFLICT DO UPDATE for all keys
+        stmt = sqlite_insert(models.Settings).values(
+            [{"key": key, "value": value or ""} for key, value in updates.items()]
+        )
         stmt = stmt.on_conflict_do_update(
             index_elements=["key"],
-            set_={"value": value or ""}
+            set_={"value": stmt.excluded.value}
         )
         db.execute(stmt)
     db.commit()
+    invalidate_settings_cache()
     return get_settings(db)
 
 
+@serialized_write
 def set_setting(db: Session, key: str, value: str):
     """Set a single setting value."""
     row = db.query(models.Settings).filter(models.Settings.key == key).first()
@@ -55,15 +107,73 @@ def set_setting(db: Session, key: str, value: str):
     else:
         db.add(models.Settings(key=key, value=value))
     db.commit()
+    invalidate_settings_cache()
 
 
 
+# ── Pagination ────────────────────────────────────────────────────────
+
+def _paginate(query, order_by, page: int, size: int) -> dict:
+    """Fetch one page and the total row count in a single query.
+
+    The total comes from a COUNT(*) OVER () window column, so no separate
+    COUNT query is needed unless the page is past the end of the result.
+    """
+    rows = (
+        query.add_columns(func.count().over().label("_total"))
+        .order_by(order_by)
+        .offset((page - 1) * size)
+        .limit(size)
+        .all()
+    )
+    if rows:
+        total = rows[0]._total
+    elif page > 1 and size > 0:
+        total = query.count()
+    else:
+        total = 0
+    pages = (total + size - 1) // size if size > 0 else 1
+
+    return {
+        "items": [row[0] for row in rows],
+        "total": total,
+        "page": page,
+        "size": size,
+        "pages": pages
+    }
+
+
 # ── Clients ───────────────────────────────────────────────────────────
 
+# Trigram FTS5 index created by the startup migration (see main._CLIENTS_FTS_DDL)
+_clients_fts = table("clients_fts", literal_column("rowid"))
+_clients_fts_available: Optional[bool] = None
+
+
+def _has_clients_fts(db: Session) -> bool:
+    global _clients_fts_available
+    if _clients_fts_available is None:
+        _clients_fts_available = db.execute(
+            select(literal_column("1"))
+            .select_from(table("sqlite_master", literal_column("name")))
+            .where(literal_column("name") == "clients_fts")
+        ).first() is not None
+    return _clients_fts_available
+
+
 def get_clients(db: Session, page: int = 1, size: int = 10, search: str = None) -> dict:
     query = db.query(models.Client)
     
-    if search:
+    if search and len(search) >= 3 and _has_clients_fts(db):
+        # Trigram index answers substring matches without scanning clients;
+        # the term is quoted as a single FTS5 phrase so its characters are literal
+        phrase = '"' + search.replace('"', '""') + '"'
+        matching_ids = select(literal_column("rowid")).select_from(_clients_fts).where(
+            literal_column("clients_fts").op("MATCH")(phrase)
+        )
+        query = query.filter(models.Client.id.in_(matching_ids))
+    elif search:
+        # Trigrams need at least 3 characters
         term = f"%{search}%"
         query = query.filter(
             or_(
@@ -71,49 +181,37 @@ def get_clients(db: Session, page: int = 1, size: int = 10, search: str = None)
                 models.Client.reg_number.ilike(term)
             )
         )
-        
-    total = query.count()
-    pages = (total + size - 1) // size if size > 0 else 1
-    
-    items = (
-        query.order_by(models.Client.name)
-        .offset((page - 1) * size)
-        .limit(size)
-        .all()
-    )
-    
-    return {
-        "items": items,
-        "total": total,
-        "page": page,
-        "size": size,
-        "pages": pages
-    }
+
+    return _paginate(query, models.Client.name, page, size)
 
 
 def get_client(db: Session, client_id: int) -> Optional[models.Client]:
-    return db.query(models.Client).filter(models.Client.id == client_id).first()
+    return db.execute(_CLIENT_BY_ID, {"id": client_id}).scalar_one_or_none()
 
 
+@serialized_write
 def create_client(db: Session, data: schemas.ClientCreate) -> models.Client:
-    client = models.Client(**data.model_dump())
-    db.add(client)
+    # INSERT ... RETURNING hands back the full row (server defaults included),
+    # so no refresh SELECT is needed after the commit
+    client = db.scalars(insert(models.Client).returning(models.Client), [data.model_dump()]).one()
     db.commit()
-    db.refresh(client)
     return client
 
 
+@serialized_write
 def update_client(db: Session, client_id: int, data: schemas.ClientUpdate) -> Optional[models.Client]:
-    client = get_client(db, client_id)
-    if not client:
-        return None
-    for k, v in data.model_dump().items():
-        setattr(client, k, v)
+    # One UPDATE ... RETURNING instead of SELECT + UPDATE + refresh SELECT
+    client = db.scalars(
+        update(models.Client)
+        .where(models.Client.id == client_id)
+        .values(**data.model_dump())
+        .returning(models.Client)
+    ).one_or_none()
     db.commit()
-    db.refresh(client)
     return client
 
 
+@serialized_write
 def delete_client(db: Session, client_id: int) -> bool:
     client = get_client(db, client_id)
     if not client:
@@ -131,49 +229,34 @@ def get_services(db: Session, page: int = 1, size: int = 10, search: str = None)
     if search:
         term = f"%{search}%"
         query = query.filter(models.Service.name.ilike(term))
-        
-    total = query.count()
-    pages = (total + size - 1) // size if size > 0 else 1
-    
-    items = (
-        query.order_by(models.Service.name)
-        .offset((page - 1) * size)
-        .limit(size)
-        .all()
-    )
-    
-    return {
-        "items": items,
-        "total": total,
-        "page": page,
-        "size": size,
-        "pages": pages
-    }
+
+    return _paginate(query, models.Service.name, page, size)
 
 
 def get_service(db: Session, service_id: int) -> Optional[models.Service]:
-    return db.query(models.Service).filter(models.Service.id == service_id).first()
+    return db.execute(_SERVICE_BY_ID, {"id": service_id}).scalar_one_or_none()
 
 
+@serialized_write
 def create_service(db: Session, data: schemas.ServiceCreate) -> models.Service:
-    svc = models.Service(**data.model_dump())
-    db.add(svc)
+    svc = db.scalars(insert(models.Service).returning(models.Service), [data.model_dump()]).one()
     db.commit()
-    db.refresh(svc)
     return svc
 
 
+@serialized_write
 def update_service(db: Session, service_id: int, data: schemas.ServiceUpdate) -> Optional[models.Service]:
-    svc = get_service(db, service_id)
-    if not svc:
-        return None
-    for k, v in data.model_dump().items():
-        setattr(svc, k, v)
+    svc = db.scalars(
+        update(models.Service)
+        .where(models.Service.id == service_id)
+        .values(**data.model_dump())
+        .returning(models.Service)
+    ).one_or_none()
     db.commit()
-    db.refresh(svc)
     return svc
 
 
+@serialized_write
 def delete_service(db: Session, service_id: int) -> bool:
     svc = get_service(db, service_id)
     if not svc:
@@ -187,19 +270,24 @@ def delete_service(db: Session, service_id: int) -> bool:
 
 def get_invoices(db: Session, page: int = 1, size: int = 10, search: str = None,
                  status: str = None, date_from: date_type = None, date_to: date_type = None) -> dict:
-    query = db.query(models.Invoice).options(
-        joinedload(models.Invoice.client), 
-        joinedload(models.Invoice.items)
-    )
+    # Items via a follow-up IN (...) query — joining them would repeat every
+    # invoice row once per line item. Any other relationship access raises
+    # instead of silently lazy-loading one query per listed invoice.
+    query = db.query(models.Invoice).options(selectinload(models.Invoice.items), raiseload("*"))
     
     if search:
         term = f"%{search}%"
-        query = query.join(models.Client).filter(
+        # Reuse the filter join to populate Invoice.client instead of a second JOIN
+        query = query.join(models.Invoice.client).options(
+            contains_eager(models.Invoice.client)
+        ).filter(
             or_(
                 models.Invoice.invoice_number.ilike(term),
                 models.Client.name.ilike(term)
             )
         )
+    else:
+        query = query.options(joinedload(models.Invoice.client))
     
     if status:
         query = query.filter(models.Invoice.status == status)
@@ -209,35 +297,41 @@ def get_invoices(db: Session, page: int = 1, size: int = 10, search: str = None,
     
     if date_to:
         query = query.filter(models.Invoice.date <= date_to)
-    
-    total = query.count()
-    pages = (total + size - 1) // size if size > 0 else 1
-    
-    items = (
-        query.order_by(models.Invoice.id.desc())
-        .offset((page - 1) * size)
-        .limit(size)
-        .all()
-    )
-    
-    return {
-        "items": items,
-        "total": total,
-        "page": page,
-        "size": size,
-        "pages": pages
-    }
+
+    return _paginate(query, models.Invoice.id.desc(), page, size)
 
 
 def get_invoice(db: Session, invoice_id: int) -> Optional[models.Invoice]:
-    return (
+    return db.execute(_INVOICE_BY_ID, {"id": invoice_id}).unique().scalar_one_or_none()
+
+
+def get_invoices_by_ids(db: Session, invoice_ids: List[int]) -> List[models.Invoice]:
+    """Load several invoices with client and items in 3 queries, in the requested order.
+
+    Unknown ids are skipped.
+    """
+    if not invoice_ids:
+        return []
+    rows = (
         db.query(models.Invoice)
-        .options(joinedload(models.Invoice.client), joinedload(models.Invoice.items))
-        .filter(models.Invoice.id == invoice_id)
-        .first()
+        .options(joinedload(models.Invoice.client), selectinload(models.Invoice.items))
+        .filter(models.Invoice.id.in_(invoice_ids))
+        .all()
     )
+    by_id = {inv.id: inv for inv in rows}
+    return [by_id[inv_id] for inv_id in invoice_ids if inv_id in by_id]
+
 
+def _insert_invoice_items(db: Session, invoice_id: int, items_data: List[dict]) -> List[models.InvoiceItem]:
+    """Insert all lines of an invoice with one batched INSERT ... RETURNING."""
+    if not items_data:
+        return []
+    rows = [{**item_data, "invoice_id": invoice_id} for item_data in items_data]
+    stmt = insert(models.InvoiceItem).returning(models.InvoiceItem, sort_by_parameter_order=True)
+    return list(db.scalars(stmt, rows))
 
+
+@serialized_write
 def create_invoice(db: Session, data: schemas.InvoiceCreate) -> models.Invoice:
     invoice_number = generate_invoice_number(db)
     invoice = models.Invoice(
@@ -251,17 +345,18 @@ def create_invoice(db: Session, data: schemas.InvoiceCreate) -> models.Invoice:
     db.add(invoice)
     db.flush()
 
-    for item_data in data.items:
-        item = models.InvoiceItem(invoice_id=invoice.id, **item_data.model_dump())
-        db.add(item)
+    items = _insert_invoice_items(db, invoice.id, [item_data.model_dump() for item_data in data.items])
+    set_committed_value(invoice, "items", items)
 
     db.commit()
-    db.refresh(invoice)
-    return get_invoice(db, invoice.id)
+    # Sessions don't expire on commit, so the in-memory invoice (with items) is
+    # returned as is; the client is lazy-loaded by primary key when serialized
+    return invoice
 
 
+@serialized_write
 def update_invoice(db: Session, invoice_id: int, data: schemas.InvoiceUpdate) -> Optional[models.Invoice]:
-    invoice = db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
+    invoice = get_invoice(db, invoice_id)
     if not invoice:
         return None
 
@@ -278,109 +373,113 @@ def update_invoice(db: Session, invoice_id: int, data: schemas.InvoiceUpdate) ->
     if items_data is not None:
         # Replace all items
         db.query(models.InvoiceItem).filter(models.InvoiceItem.invoice_id == invoice_id).delete()
-        for item_data in items_data:
-            item = models.InvoiceItem(invoice_id=invoice_id, **item_data)
-            db.add(item)
+        set_committed_value(invoice, "items", _insert_invoice_items(db, invoice_id, items_data))
 
     db.commit()
-    return get_invoice(db, invoice_id)
+    if update_data.get("client_id") is not None:
+        # The eagerly loaded client belongs to the old client_id
+        db.expire(invoice, ["client"])
+    return invoice
 
 
 def delete_invoice(db: Session, invoice_id: int) -> bool:
-    invoice = db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
-    if not invoice:
-        return False
-    db.delete(invoice)
+    # Two DELETE statements instead of loading the invoice and each of its
+    # lines for the ORM cascade
+    return delete_invoices(db, [invoice_id]) > 0
+
+
+@serialized_write
+def delete_invoices(db: Session, invoice_ids: List[int]) -> int:
+    """Delete several invoices (and their lines) in one transaction; returns how many existed."""
+    if not invoice_ids:
+        return 0
+    # Bulk DELETEs skip the ORM cascade (and SQLite isn't enforcing ON DELETE
+    # CASCADE), so remove the lines explicitly first
+    db.query(models.InvoiceItem).filter(
+        models.InvoiceItem.invoice_id.in_(invoice_ids)
+    ).delete(synchronize_session=False)
+    deleted = db.query(models.Invoice).filter(
+        models.Invoice.id.in_(invoice_ids)
+    ).delete(synchronize_session=False)
     db.commit()
-    return True
+    return deleted
 
 
 # ── User Profile ──────────────────────────────────────────────────────
 
 def update_user_profile(db: Session, current_username: str, data: schemas.UserProfileUpdate):
-    from .models import User
     from .auth import get_password_hash
+
+    # bcrypt is deliberately slow: hash before taking the write lock, so other
+    # writes don't wait on it
+    password_hash = get_password_hash(data.password) if data.password else None
+    return _save_user_profile(db, current_username, data.username, password_hash)
+
+
+@serialized_write
+def _save_user_profile(db: Session, current_username: str, username: str, password_hash: Optional[str]):
+    from .models import User
+    from .auth import invalidate_user_tokens
     
     user = db.query(User).filter(User.username == current_username).first()
     if not user:
         return None
         
-    user.username = data.username
-    if data.password:
-        user.password_hash = get_password_hash(data.password)
+    user.username = username
+    if password_hash:
+        user.password_hash = password_hash
         
     db.commit()
     db.refresh(user)
+    invalidate_user_tokens(current_username)
     return user
 
 def get_stats(db: Session) -> dict:
-    """Calculate dashboard statistics using SQL aggregations."""
+    """Calculate dashboard statistics in one SQL pass over the invoice lines."""
     from datetime import date
     import calendar
 
     today = date.today()
-
-    # Unpaid total — sum line items for non-paid invoices using SQL
-    unpaid_q = (
-        db.query(
-            func.sum(
-                models.InvoiceItem.quantity * models.InvoiceItem.unit_price *
-                (1 + models.InvoiceItem.vat_rate / 100)
-            )
-        )
-        .join(models.Invoice, models.InvoiceItem.invoice_id == models.Invoice.id)
-        .filter(models.Invoice.status != "paid")
-        .scalar()
+    line_total = (
+        models.InvoiceItem.quantity * models.InvoiceItem.unit_price *
+        (1 + models.InvoiceItem.vat_rate / 100)
     )
-    unpaid_total = round(unpaid_q or 0, 2)
-
-    # Monthly turnover — current month
-    monthly_q = (
-        db.query(
-            func.sum(
-                models.InvoiceItem.quantity * models.InvoiceItem.unit_price *
-                (1 + models.InvoiceItem.vat_rate / 100)
-            )
-        )
-        .join(models.Invoice, models.InvoiceItem.invoice_id == models.Invoice.id)
-        .filter(
-            extract("year", models.Invoice.date) == today.year,
-            extract("month", models.Invoice.date) == today.month,
-        )
-        .scalar()
-    )
-    monthly_turnover = round(monthly_q or 0, 2)
 
-    # Last 6 months breakdown
-    monthly_data = []
+    # Last 6 months (including the current one)
+    months = []
     for i in range(5, -1, -1):
         month = today.month - i
         year = today.year
         if month <= 0:
             month += 12
             year -= 1
-        month_q = (
-            db.query(
-                func.sum(
-                    models.InvoiceItem.quantity * models.InvoiceItem.unit_price *
-                    (1 + models.InvoiceItem.vat_rate / 100)
-                )
-            )
-            .join(models.Invoice, models.InvoiceItem.invoice_id == models.Invoice.id)
-            .filter(
-                extract("year", models.Invoice.date) == year,
-                extract("month", models.Invoice.date) == month,
-            )
-            .scalar()
-        )
+        months.append((year, month))
+
+    # Conditional aggregates: unpaid total + one bucket per month, single scan
+    columns = [func.sum(case((models.Invoice.status != "paid", line_total)))]
+    for year, month in months:
+        next_month = date(year + month // 12, month % 12 + 1, 1)
+        in_month = and_(models.Invoice.date >= date(year, month, 1), models.Invoice.date < next_month)
+        columns.append(func.sum(case((in_month, line_total))))
+
+    unpaid_sum, *month_sums = (
+        db.query(*columns)
+        .select_from(models.InvoiceItem)
+        .join(models.Invoice, models.InvoiceItem.invoice_id == models.Invoice.id)
+        .one()
+    )
+    unpaid_total = round(unpaid_sum or 0, 2)
+
+    monthly_data = []
+    for (year, month), month_sum in zip(months, month_sums):
         month_name = calendar.month_name[month][:3]
         monthly_data.append({
             "label": f"{month_name} {year}",
-            "total": round(month_q or 0, 2)
+            "total": round(month_sum or 0, 2)
         })
 
     return {
         "unpaid_total": unpaid_total,
-        "monthly_turnover": monthly_turnover,
+        "monthly_turnover": monthly_data[-1]["total"],
         "monthly_data": monthly_data
     }
@@ -1,6 +1,11 @@
+import functools
 import os
+import sqlite3
 import sys
-from sqlalchemy import create_engine
+import threading
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 
@@ -22,17 +27,65 @@ DATA_DIR = _get_data_dir()
 os.makedirs(DATA_DIR, exist_ok=True)
 
 
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(DATA_DIR, 'invoices.db')}"
+DATABASE_PATH = os.path.join(DATA_DIR, 'invoices.db')
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=5,
+    max_overflow=10,
+    pool_use_lifo=True,  # reuse the most recent connection — its page cache is warm
+    pool_pre_ping=True,
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Per-connection SQLite tuning: WAL lets readers run alongside a writer."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 MB
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+    cursor.close()
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 Base = declarative_base()
 
+# SQLite has a single writer. Serializing writes in-process keeps request
+# threads from queueing on the database lock (and from racing each other for
+# the next invoice number); with WAL, readers are never blocked by this.
+write_lock = threading.RLock()
+
+
+def serialized_write(func):
+    """Decorator: run a CRUD write while holding the process-wide write lock."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with write_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+# Dedicated connection used only to read PRAGMA data_version. The counter is
+# per connection and changes whenever *another* connection commits, so it must
+# not come from the pool (our own commits would be invisible to it).
+_version_conn: Optional[sqlite3.Connection] = None
+_version_lock = threading.Lock()
+
+
+def data_version() -> int:
+    """Counter that changes after any commit to the database, from any process."""
+    global _version_conn
+    with _version_lock:
+        if _version_conn is None:
+            _version_conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+        return _version_conn.execute("PRAGMA data_version").fetchone()[0]
+
 
 def get_db():
     """FastAPI dependency that provides a database session."""
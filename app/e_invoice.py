@@ -1,193 +1,281 @@
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import io
+from typing import BinaryIO, Optional
 
-def generate_peppol_xml(invoice, client, settings) -> bytes:
-    """
-    Generate a UBL 2.1 / PEPPOL BIS Billing 3.0 compliant XML e-invoice (EN 16931).
-    invoice: app.models.Invoice or schemas.InvoiceRead
-    client: app.models.Client or schemas.ClientRead
-    settings: dictionary of settings (crud.get_settings)
-    """
-    
-    # Namespaces
-    ns = {
-        'cac': 'urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2',
-        'cbc': 'urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2',
-        '': 'urn:oasis:names:specification:ubl:schema:xsd:Invoice-2'
-    }
+# Namespaces
+NS_INVOICE = 'urn:oasis:names:specification:ubl:schema:xsd:Invoice-2'
+NS_CAC = 'urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2'
+NS_CBC = 'urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2'
 
-    # Register namespaces for correct prefixing during serialization
-    ET.register_namespace('', ns[''])
-    ET.register_namespace('cac', ns['cac'])
-    ET.register_namespace('cbc', ns['cbc'])
+# Register namespaces for correct prefixing during serialization
+ET.register_namespace('', NS_INVOICE)
+ET.register_namespace('cac', NS_CAC)
+ET.register_namespace('cbc', NS_CBC)
 
-    root = ET.Element(f"{{{ns['']}}}Invoice")
+# Clark-notation tags, built once instead of formatting them for every element
+INVOICE = f"{{{NS_INVOICE}}}Invoice"
+CAC_ACCOUNTING_CUSTOMER_PARTY = f"{{{NS_CAC}}}AccountingCustomerParty"
+CAC_ACCOUNTING_SUPPLIER_PARTY = f"{{{NS_CAC}}}AccountingSupplierParty"
+CAC_CLASSIFIED_TAX_CATEGORY = f"{{{NS_CAC}}}ClassifiedTaxCategory"
+CAC_COUNTRY = f"{{{NS_CAC}}}Country"
+CAC_FINANCIAL_INSTITUTION_BRANCH = f"{{{NS_CAC}}}FinancialInstitutionBranch"
+CAC_INVOICE_LINE = f"{{{NS_CAC}}}InvoiceLine"
+CAC_ITEM = f"{{{NS_CAC}}}Item"
+CAC_LEGAL_MONETARY_TOTAL = f"{{{NS_CAC}}}LegalMonetaryTotal"
+CAC_PARTY = f"{{{NS_CAC}}}Party"
+CAC_PARTY_LEGAL_ENTITY = f"{{{NS_CAC}}}PartyLegalEntity"
+CAC_PARTY_NAME = f"{{{NS_CAC}}}PartyName"
+CAC_PARTY_TAX_SCHEME = f"{{{NS_CAC}}}PartyTaxScheme"
+CAC_PAYEE_FINANCIAL_ACCOUNT = f"{{{NS_CAC}}}PayeeFinancialAccount"
+CAC_PAYMENT_MEANS = f"{{{NS_CAC}}}PaymentMeans"
+CAC_POSTAL_ADDRESS = f"{{{NS_CAC}}}PostalAddress"
+CAC_PRICE = f"{{{NS_CAC}}}Price"
+CAC_TAX_CATEGORY = f"{{{NS_CAC}}}TaxCategory"
+CAC_TAX_SCHEME = f"{{{NS_CAC}}}TaxScheme"
+CAC_TAX_SUBTOTAL = f"{{{NS_CAC}}}TaxSubtotal"
+CAC_TAX_TOTAL = f"{{{NS_CAC}}}TaxTotal"
+CBC_CITY_NAME = f"{{{NS_CBC}}}CityName"
+CBC_COMPANY_ID = f"{{{NS_CBC}}}CompanyID"
+CBC_CUSTOMIZATION_ID = f"{{{NS_CBC}}}CustomizationID"
+CBC_DOCUMENT_CURRENCY_CODE = f"{{{NS_CBC}}}DocumentCurrencyCode"
+CBC_DUE_DATE = f"{{{NS_CBC}}}DueDate"
+CBC_ENDPOINT_ID = f"{{{NS_CBC}}}EndpointID"
+CBC_ID = f"{{{NS_CBC}}}ID"
+CBC_IDENTIFICATION_CODE = f"{{{NS_CBC}}}IdentificationCode"
+CBC_INVOICE_TYPE_CODE = f"{{{NS_CBC}}}InvoiceTypeCode"
+CBC_INVOICED_QUANTITY = f"{{{NS_CBC}}}InvoicedQuantity"
+CBC_ISSUE_DATE = f"{{{NS_CBC}}}IssueDate"
+CBC_LINE_EXTENSION_AMOUNT = f"{{{NS_CBC}}}LineExtensionAmount"
+CBC_NAME = f"{{{NS_CBC}}}Name"
+CBC_PAYABLE_AMOUNT = f"{{{NS_CBC}}}PayableAmount"
+CBC_PAYMENT_MEANS_CODE = f"{{{NS_CBC}}}PaymentMeansCode"
+CBC_PERCENT = f"{{{NS_CBC}}}Percent"
+CBC_POSTAL_ZONE = f"{{{NS_CBC}}}PostalZone"
+CBC_PRICE_AMOUNT = f"{{{NS_CBC}}}PriceAmount"
+CBC_PROFILE_ID = f"{{{NS_CBC}}}ProfileID"
+CBC_REGISTRATION_NAME = f"{{{NS_CBC}}}RegistrationName"
+CBC_STREET_NAME = f"{{{NS_CBC}}}StreetName"
+CBC_TAX_AMOUNT = f"{{{NS_CBC}}}TaxAmount"
+CBC_TAX_EXCLUSIVE_AMOUNT = f"{{{NS_CBC}}}TaxExclusiveAmount"
+CBC_TAX_INCLUSIVE_AMOUNT = f"{{{NS_CBC}}}TaxInclusiveAmount"
+CBC_TAXABLE_AMOUNT = f"{{{NS_CBC}}}TaxableAmount"
 
-    # Customization and Profile ID for PEPPOL BIS Billing 3.0
-    ET.SubElement(root, f"{{{ns['cbc']}}}CustomizationID").text = "urn:cen.eu:en16931:2017#compliant#urn:fdc:peppol.eu:2017:poacc:billing:3.0"
-    ET.SubElement(root, f"{{{ns['cbc']}}}ProfileID").text = "urn:fdc:peppol.eu:2017:poacc:billing:01:1.0"
 
-    # Invoice basic info
-    ET.SubElement(root, f"{{{ns['cbc']}}}ID").text = f"{settings.get('invoice_prefix', 'INV')}-{invoice.id:06d}"
-    ET.SubElement(root, f"{{{ns['cbc']}}}IssueDate").text = str(invoice.date)
-    ET.SubElement(root, f"{{{ns['cbc']}}}DueDate").text = str(invoice.due_date)
-    ET.SubElement(root, f"{{{ns['cbc']}}}InvoiceTypeCode").text = "380" # 380 = Commercial Invoice
-    ET.SubElement(root, f"{{{ns['cbc']}}}DocumentCurrencyCode").text = "EUR"
+# Seller-side subtrees, rebuilt only when one of the settings they show changes:
+# (values of _SELLER_SETTINGS_KEYS, (supplier element, payment means element))
+_SELLER_SETTINGS_KEYS = (
+    'company_name', 'reg_number', 'vat_number', 'vat_enabled', 'legal_address',
+    'bank1_account', 'bank1_swift',
+)
+_seller_cache: tuple = (None, None)
+
+
+def _seller_elements(settings) -> tuple:
+    """Return the (AccountingSupplierParty, PaymentMeans) elements for ``settings``.
+
+    ElementTree elements keep no parent pointer, so the same subtree can be
+    appended to any number of invoice documents; they must not be modified.
+    """
+    global _seller_cache
+    key = tuple(settings.get(k) for k in _SELLER_SETTINGS_KEYS)
+    cached_key, elements = _seller_cache
+    if key == cached_key:
+        return elements
 
     # ── AccountingSupplierParty (Seller) ──
-    supplier = ET.SubElement(root, f"{{{ns['cac']}}}AccountingSupplierParty")
-    party_supplier = ET.SubElement(supplier, f"{{{ns['cac']}}}Party")
+    supplier = ET.Element(CAC_ACCOUNTING_SUPPLIER_PARTY)
+    party_supplier = ET.SubElement(supplier, CAC_PARTY)
     
     # Endpoint ID (usually VAT or Reg no)
     endpoint_scheme = "9936" if settings.get('vat_number') else "0184" # 9936: Latvian VAT, 0184: Latvian Reg
     endpoint_id = settings.get('vat_number') or settings.get('reg_number') or "UNKNOWN"
-    endpoint_el = ET.SubElement(party_supplier, f"{{{ns['cbc']}}}EndpointID", schemeID=endpoint_scheme)
+    endpoint_el = ET.SubElement(party_supplier, CBC_ENDPOINT_ID, schemeID=endpoint_scheme)
     endpoint_el.text = endpoint_id
 
     # Supplier Name
-    party_name_supp = ET.SubElement(party_supplier, f"{{{ns['cac']}}}PartyName")
-    ET.SubElement(party_name_supp, f"{{{ns['cbc']}}}Name").text = settings.get('company_name', 'Unknown Company')
+    party_name_supp = ET.SubElement(party_supplier, CAC_PARTY_NAME)
+    ET.SubElement(party_name_supp, CBC_NAME).text = settings.get('company_name', 'Unknown Company')
 
     # Supplier Postal Address
-    postal_supp = ET.SubElement(party_supplier, f"{{{ns['cac']}}}PostalAddress")
-    ET.SubElement(postal_supp, f"{{{ns['cbc']}}}StreetName").text = settings.get('legal_address', '')
-    ET.SubElement(postal_supp, f"{{{ns['cbc']}}}CityName").text = "Riga" # Fallback if not parsed
+    postal_supp = ET.SubElement(party_supplier, CAC_POSTAL_ADDRESS)
+    ET.SubElement(postal_supp, CBC_STREET_NAME).text = settings.get('legal_address', '')
+    ET.SubElement(postal_supp, CBC_CITY_NAME).text = "Riga" # Fallback if not parsed
     # We could parse zip/city from address if needed, keeping simple for now
-    country_supp = ET.SubElement(postal_supp, f"{{{ns['cac']}}}Country")
-    ET.SubElement(country_supp, f"{{{ns['cbc']}}}IdentificationCode").text = "LV"
+    country_supp = ET.SubElement(postal_supp, CAC_COUNTRY)
+    ET.SubElement(country_supp, CBC_IDENTIFICATION_CODE).text = "LV"
 
     # Supplier Legal Entity
-    legal_entity_supp = ET.SubElement(party_supplier, f"{{{ns['cac']}}}PartyLegalEntity")
-    ET.SubElement(legal_entity_supp, f"{{{ns['cbc']}}}RegistrationName").text = settings.get('company_name', 'Unknown Company')
-    ET.SubElement(legal_entity_supp, f"{{{ns['cbc']}}}CompanyID").text = settings.get('reg_number', '')
+    legal_entity_supp = ET.SubElement(party_supplier, CAC_PARTY_LEGAL_ENTITY)
+    ET.SubElement(legal_entity_supp, CBC_REGISTRATION_NAME).text = settings.get('company_name', 'Unknown Company')
+    ET.SubElement(legal_entity_supp, CBC_COMPANY_ID).text = settings.get('reg_number', '')
 
     # Supplier Tax Scheme
     if settings.get('vat_enabled') == 'true' and settings.get('vat_number'):
-        tax_scheme_supp = ET.SubElement(party_supplier, f"{{{ns['cac']}}}PartyTaxScheme")
-        ET.SubElement(tax_scheme_supp, f"{{{ns['cbc']}}}CompanyID").text = settings.get('vat_number')
-        tax_scheme = ET.SubElement(tax_scheme_supp, f"{{{ns['cac']}}}TaxScheme")
-        ET.SubElement(tax_scheme, f"{{{ns['cbc']}}}ID").text = "VAT"
+        tax_scheme_supp = ET.SubElement(party_supplier, CAC_PARTY_TAX_SCHEME)
+        ET.SubElement(tax_scheme_supp, CBC_COMPANY_ID).text = settings.get('vat_number')
+        tax_scheme = ET.SubElement(tax_scheme_supp, CAC_TAX_SCHEME)
+        ET.SubElement(tax_scheme, CBC_ID).text = "VAT"
+
+    # ── PaymentMeans ──
+    payment_means = ET.Element(CAC_PAYMENT_MEANS)
+    ET.SubElement(payment_means, CBC_PAYMENT_MEANS_CODE).text = "30" # Credit transfer
+    payee_account = ET.SubElement(payment_means, CAC_PAYEE_FINANCIAL_ACCOUNT)
+    ET.SubElement(payee_account, CBC_ID).text = settings.get('bank1_account', 'N/A')
+    payee_institution = ET.SubElement(payee_account, CAC_FINANCIAL_INSTITUTION_BRANCH)
+    ET.SubElement(payee_institution, CBC_ID).text = settings.get('bank1_swift', 'N/A')
+
+    elements = (supplier, payment_means)
+    _seller_cache = (key, elements)
+    return elements
+
+
+def generate_peppol_xml(invoice, client, settings, out: Optional[BinaryIO] = None) -> Optional[bytes]:
+    """
+    Generate a UBL 2.1 / PEPPOL BIS Billing 3.0 compliant XML e-invoice (EN 16931).
+    invoice: app.models.Invoice or schemas.InvoiceRead
+    client: app.models.Client or schemas.ClientRead
+    settings: dictionary of settings (crud.get_settings)
+    out: optional binary stream; if given, the XML is written into it and None is returned
+    """
+    
+    root = ET.Element(INVOICE)
+
+    # Customization and Profile ID for PEPPOL BIS Billing 3.0
+    ET.SubElement(root, CBC_CUSTOMIZATION_ID).text = "urn:cen.eu:en16931:2017#compliant#urn:fdc:peppol.eu:2017:poacc:billing:3.0"
+    ET.SubElement(root, CBC_PROFILE_ID).text = "urn:fdc:peppol.eu:2017:poacc:billing:01:1.0"
+
+    # Invoice basic info
+    ET.SubElement(root, CBC_ID).text = f"{settings.get('invoice_prefix', 'INV')}-{invoice.id:06d}"
+    ET.SubElement(root, CBC_ISSUE_DATE).text = str(invoice.date)
+    ET.SubElement(root, CBC_DUE_DATE).text = str(invoice.due_date)
+    ET.SubElement(root, CBC_INVOICE_TYPE_CODE).text = "380" # 380 = Commercial Invoice
+    ET.SubElement(root, CBC_DOCUMENT_CURRENCY_CODE).text = "EUR"
+
+    # Supplier party and payment means depend only on the settings; the
+    # prebuilt subtrees are shared by every invoice (see _seller_elements)
+    supplier, payment_means = _seller_elements(settings)
+    root.append(supplier)
 
     # ── AccountingCustomerParty (Buyer) ──
-    customer = ET.SubElement(root, f"{{{ns['cac']}}}AccountingCustomerParty")
-    party_customer = ET.SubElement(customer, f"{{{ns['cac']}}}Party")
+    customer = ET.SubElement(root, CAC_ACCOUNTING_CUSTOMER_PARTY)
+    party_customer = ET.SubElement(customer, CAC_PARTY)
 
     cust_endpoint_scheme = "9936" if getattr(client, 'vat_number', None) else "0184"
     cust_endpoint_id = getattr(client, 'vat_number', None) or getattr(client, 'reg_number', None) or "UNKNOWN"
-    cust_endpoint_el = ET.SubElement(party_customer, f"{{{ns['cbc']}}}EndpointID", schemeID=cust_endpoint_scheme)
+    cust_endpoint_el = ET.SubElement(party_customer, CBC_ENDPOINT_ID, schemeID=cust_endpoint_scheme)
     cust_endpoint_el.text = cust_endpoint_id
 
     # Customer Name
-    party_name_cust = ET.SubElement(party_customer, f"{{{ns['cac']}}}PartyName")
-    ET.SubElement(party_name_cust, f"{{{ns['cbc']}}}Name").text = client.name
+    party_name_cust = ET.SubElement(party_customer, CAC_PARTY_NAME)
+    ET.SubElement(party_name_cust, CBC_NAME).text = client.name
 
     # Customer Postal Address
-    postal_cust = ET.SubElement(party_customer, f"{{{ns['cac']}}}PostalAddress")
-    ET.SubElement(postal_cust, f"{{{ns['cbc']}}}StreetName").text = getattr(client, 'address', '') or ''
+    postal_cust = ET.SubElement(party_customer, CAC_POSTAL_ADDRESS)
+    ET.SubElement(postal_cust, CBC_STREET_NAME).text = getattr(client, 'address', '') or ''
     if getattr(client, 'postal_code', None):
-        ET.SubElement(postal_cust, f"{{{ns['cbc']}}}PostalZone").text = client.postal_code
-    country_cust = ET.SubElement(postal_cust, f"{{{ns['cac']}}}Country")
-    ET.SubElement(country_cust, f"{{{ns['cbc']}}}IdentificationCode").text = "LV"
+        ET.SubElement(postal_cust, CBC_POSTAL_ZONE).text = client.postal_code
+    country_cust = ET.SubElement(postal_cust, CAC_COUNTRY)
+    ET.SubElement(country_cust, CBC_IDENTIFICATION_CODE).text = "LV"
 
     # Customer Legal Entity
-    legal_entity_cust = ET.SubElement(party_customer, f"{{{ns['cac']}}}PartyLegalEntity")
-    ET.SubElement(legal_entity_cust, f"{{{ns['cbc']}}}RegistrationName").text = client.name
+    legal_entity_cust = ET.SubElement(party_customer, CAC_PARTY_LEGAL_ENTITY)
+    ET.SubElement(legal_entity_cust, CBC_REGISTRATION_NAME).text = client.name
     if getattr(client, 'reg_number', None):
-        ET.SubElement(legal_entity_cust, f"{{{ns['cbc']}}}CompanyID").text = client.reg_number
+        ET.SubElement(legal_entity_cust, CBC_COMPANY_ID).text = client.reg_number
 
     # Customer Tax Scheme
     if getattr(client, 'vat_number', None):
-        tax_scheme_cust = ET.SubElement(party_customer, f"{{{ns['cac']}}}PartyTaxScheme")
-        ET.SubElement(tax_scheme_cust, f"{{{ns['cbc']}}}CompanyID").text = client.vat_number
-        tax_scheme = ET.SubElement(tax_scheme_cust, f"{{{ns['cac']}}}TaxScheme")
-        ET.SubElement(tax_scheme, f"{{{ns['cbc']}}}ID").text = "VAT"
+        tax_scheme_cust = ET.SubElement(party_customer, CAC_PARTY_TAX_SCHEME)
+        ET.SubElement(tax_scheme_cust, CBC_COMPANY_ID).text = client.vat_number
+        tax_scheme = ET.SubElement(tax_scheme_cust, CAC_TAX_SCHEME)
+        ET.SubElement(tax_scheme, CBC_ID).text = "VAT"
 
-    # ── PaymentMeans ──
-    payment_means = ET.SubElement(root, f"{{{ns['cac']}}}PaymentMeans")
-    ET.SubElement(payment_means, f"{{{ns['cbc']}}}PaymentMeansCode").text = "30" # Credit transfer
-    payee_account = ET.SubElement(payment_means, f"{{{ns['cac']}}}PayeeFinancialAccount")
-    ET.SubElement(payee_account, f"{{{ns['cbc']}}}ID").text = settings.get('bank1_account', 'N/A')
-    payee_institution = ET.SubElement(payee_account, f"{{{ns['cac']}}}FinancialInstitutionBranch")
-    ET.SubElement(payee_institution, f"{{{ns['cbc']}}}ID").text = settings.get('bank1_swift', 'N/A')
-
-    # Calculate Totals
+    root.append(payment_means)
+
+    # Calculate Totals and build the InvoiceLines in a single pass; the lines
+    # are attached to the document after the totals blocks below
     line_extension_amount = 0.0
     tax_exclusive_amount = 0.0
     tax_inclusive_amount = 0.0
     payable_amount = 0.0
 
     tax_subtotals = {}
+    invoice_lines = []
+    vat_enabled = settings.get('vat_enabled') == 'true'
 
-    for item in invoice.items:
+    for line_id, item in enumerate(invoice.items, 1):
         qty = float(item.quantity)
         price = float(item.unit_price)
-        vat_rate = float(item.vat_rate) if settings.get('vat_enabled') == 'true' else 0.0
+        vat_rate = float(item.vat_rate) if vat_enabled else 0.0
         
+        # Group taxes; the VAT multiplier is computed once per distinct rate
+        rate_key = "%.2f" % vat_rate
+        tax_data = tax_subtotals.get(rate_key)
+        if tax_data is None:
+            tax_data = tax_subtotals[rate_key] = {
+                'amount': 0.0, 'base': 0.0, 'rate': vat_rate, 'mult': 1 + vat_rate / 100,
+            }
+
         line_total = qty * price
         line_extension_amount += line_total
         tax_excl = line_total
-        tax_incl = tax_excl * (1 + vat_rate / 100)
+        tax_incl = tax_excl * tax_data['mult']
         
         tax_exclusive_amount += tax_excl
         tax_inclusive_amount += tax_incl
+        tax_data['amount'] += (tax_incl - tax_excl)
+        tax_data['base'] += tax_excl
+
+        # ── InvoiceLine ──
+        invoice_line = ET.Element(CAC_INVOICE_LINE)
+        ET.SubElement(invoice_line, CBC_ID).text = str(line_id)
+        ET.SubElement(invoice_line, CBC_INVOICED_QUANTITY, unitCode="EA").text = "%.2f" % qty # 'EA' for Each (gab.)
+        ET.SubElement(invoice_line, CBC_LINE_EXTENSION_AMOUNT, currencyID="EUR").text = "%.2f" % line_total
+        
+        item_node = ET.SubElement(invoice_line, CAC_ITEM)
+        ET.SubElement(item_node, CBC_NAME).text = item.description or "Service"
+        
+        item_tax = ET.SubElement(item_node, CAC_CLASSIFIED_TAX_CATEGORY)
+        ET.SubElement(item_tax, CBC_ID).text = "S" if vat_rate > 0 else "E"
+        ET.SubElement(item_tax, CBC_PERCENT).text = rate_key
+        scheme2 = ET.SubElement(item_tax, CAC_TAX_SCHEME)
+        ET.SubElement(scheme2, CBC_ID).text = "VAT"
         
-        # Group taxes
-        rate_key = f"{vat_rate:.2f}"
-        if rate_key not in tax_subtotals:
-            tax_subtotals[rate_key] = {'amount': 0.0, 'base': 0.0, 'rate': vat_rate}
-        tax_subtotals[rate_key]['amount'] += (tax_incl - tax_excl)
-        tax_subtotals[rate_key]['base'] += tax_excl
+        price_node = ET.SubElement(invoice_line, CAC_PRICE)
+        ET.SubElement(price_node, CBC_PRICE_AMOUNT, currencyID="EUR").text = "%.2f" % price
+        invoice_lines.append(invoice_line)
 
     payable_amount = tax_inclusive_amount
 
     # ── TaxTotal ──
-    tax_total = ET.SubElement(root, f"{{{ns['cac']}}}TaxTotal")
-    ET.SubElement(tax_total, f"{{{ns['cbc']}}}TaxAmount", currencyID="EUR").text = f"{(tax_inclusive_amount - tax_exclusive_amount):.2f}"
+    tax_total = ET.SubElement(root, CAC_TAX_TOTAL)
+    ET.SubElement(tax_total, CBC_TAX_AMOUNT, currencyID="EUR").text = "%.2f" % (tax_inclusive_amount - tax_exclusive_amount)
     
     for rate_key, tax_data in tax_subtotals.items():
-        tax_subtotal = ET.SubElement(tax_total, f"{{{ns['cac']}}}TaxSubtotal")
-        ET.SubElement(tax_subtotal, f"{{{ns['cbc']}}}TaxableAmount", currencyID="EUR").text = f"{tax_data['base']:.2f}"
-        ET.SubElement(tax_subtotal, f"{{{ns['cbc']}}}TaxAmount", currencyID="EUR").text = f"{tax_data['amount']:.2f}"
-        tax_category = ET.SubElement(tax_subtotal, f"{{{ns['cac']}}}TaxCategory")
-        ET.SubElement(tax_category, f"{{{ns['cbc']}}}ID").text = "S" if tax_data['rate'] > 0 else "E" # S=Standard, E=Exempt
-        ET.SubElement(tax_category, f"{{{ns['cbc']}}}Percent").text = f"{tax_data['rate']:.2f}"
-        scheme = ET.SubElement(tax_category, f"{{{ns['cac']}}}TaxScheme")
-        ET.SubElement(scheme, f"{{{ns['cbc']}}}ID").text = "VAT"
+        tax_subtotal = ET.SubElement(tax_total, CAC_TAX_SUBTOTAL)
+        ET.SubElement(tax_subtotal, CBC_TAXABLE_AMOUNT, currencyID="EUR").text = "%.2f" % tax_data['base']
+        ET.SubElement(tax_subtotal, CBC_TAX_AMOUNT, currencyID="EUR").text = "%.2f" % tax_data['amount']
+        tax_category = ET.SubElement(tax_subtotal, CAC_TAX_CATEGORY)
+        ET.SubElement(tax_category, CBC_ID).text = "S" if tax_data['rate'] > 0 else "E" # S=Standard, E=Exempt
+        ET.SubElement(tax_category, CBC_PERCENT).text = "%.2f" % tax_data['rate']
+        scheme = ET.SubElement(tax_category, CAC_TAX_SCHEME)
+        ET.SubElement(scheme, CBC_ID).text = "VAT"
 
     # ── LegalMonetaryTotal ──
-    legal_monetary_total = ET.SubElement(root, f"{{{ns['cac']}}}LegalMonetaryTotal")
-    ET.SubElement(legal_monetary_total, f"{{{ns['cbc']}}}LineExtensionAmount", currencyID="EUR").text = f"{line_extension_amount:.2f}"
-    ET.SubElement(legal_monetary_total, f"{{{ns['cbc']}}}TaxExclusiveAmount", currencyID="EUR").text = f"{tax_exclusive_amount:.2f}"
-    ET.SubElement(legal_monetary_total, f"{{{ns['cbc']}}}TaxInclusiveAmount", currencyID="EUR").text = f"{tax_inclusive_amount:.2f}"
-    ET.SubElement(legal_monetary_total, f"{{{ns['cbc']}}}PayableAmount", currencyID="EUR").text = f"{payable_amount:.2f}"
+    legal_monetary_total = ET.SubElement(root, CAC_LEGAL_MONETARY_TOTAL)
+    ET.SubElement(legal_monetary_total, CBC_LINE_EXTENSION_AMOUNT, currencyID="EUR").text = "%.2f" % line_extension_amount
+    ET.SubElement(legal_monetary_total, CBC_TAX_EXCLUSIVE_AMOUNT, currencyID="EUR").text = "%.2f" % tax_exclusive_amount
+    ET.SubElement(legal_monetary_total, CBC_TAX_INCLUSIVE_AMOUNT, currencyID="EUR").text = "%.2f" % tax_inclusive_amount
+    ET.SubElement(legal_monetary_total, CBC_PAYABLE_AMOUNT, currencyID="EUR").text = "%.2f" % payable_amount
 
     # ── InvoiceLines ──
-    line_id = 1
-    for item in invoice.items:
-        qty = float(item.quantity)
-        price = float(item.unit_price)
-        vat_rate = float(item.vat_rate) if settings.get('vat_enabled') == 'true' else 0.0
-        
-        invoice_line = ET.SubElement(root, f"{{{ns['cac']}}}InvoiceLine")
-        ET.SubElement(invoice_line, f"{{{ns['cbc']}}}ID").text = str(line_id)
-        ET.SubElement(invoice_line, f"{{{ns['cbc']}}}InvoicedQuantity", unitCode="EA").text = f"{qty:.2f}" # 'EA' for Each (gab.)
-        ET.SubElement(invoice_line, f"{{{ns['cbc']}}}LineExtensionAmount", currencyID="EUR").text = f"{(qty * price):.2f}"
-        
-        item_node = ET.SubElement(invoice_line, f"{{{ns['cac']}}}Item")
-        ET.SubElement(item_node, f"{{{ns['cbc']}}}Name").text = item.description or "Service"
-        
-        item_tax = ET.SubElement(item_node, f"{{{ns['cac']}}}ClassifiedTaxCategory")
-        ET.SubElement(item_tax, f"{{{ns['cbc']}}}ID").text = "S" if vat_rate > 0 else "E"
-        ET.SubElement(item_tax, f"{{{ns['cbc']}}}Percent").text = f"{vat_rate:.2f}"
-        scheme2 = ET.SubElement(item_tax, f"{{{ns['cac']}}}TaxScheme")
-        ET.SubElement(scheme2, f"{{{ns['cbc']}}}ID").text = "VAT"
-        
-        price_node = ET.SubElement(invoice_line, f"{{{ns['cac']}}}Price")
-        ET.SubElement(price_node, f"{{{ns['cbc']}}}PriceAmount", currencyID="EUR").text = f"{price:.2f}"
-        
-        line_id += 1
+    root.extend(invoice_lines)
 
-    # XML string output
+    # XML output
     # Encoding with xml_declaration ensures proper prolog: <?xml version="1.0" encoding="UTF-8"?>
+    if out is not None:
+        # Serialize straight into the caller's stream, no intermediate bytes copy
+        ET.ElementTree(root).write(out, encoding='UTF-8', xml_declaration=True)
+        return None
     return ET.tostring(root, encoding='UTF-8', xml_declaration=True)
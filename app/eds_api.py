@@ -1,10 +1,41 @@
+import asyncio
 import logging
 import requests
+from fastapi.concurrency import run_in_threadpool
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
 VID_EDS_API_URL = "https://eds.vid.gov.lv/api/v2/einvoice"
+EDS_MAX_CONCURRENCY = 4
+
+# One shared session so bulk submissions reuse the TCP/TLS connection.
+# A POST is only resent when EDS cannot have received it: connect errors and
+# 503 (service refused the request). Read timeouts, dropped connections, 502
+# and 504 may come after the invoice was already accepted, so a resend could
+# submit it twice — those fail and are reported instead.
+_eds_session = requests.Session()
+_eds_session.mount("https://", HTTPAdapter(
+    pool_connections=EDS_MAX_CONCURRENCY,
+    pool_maxsize=EDS_MAX_CONCURRENCY,
+    max_retries=Retry(
+        total=3,
+        connect=3,
+        read=False,
+        other=0,
+        backoff_factor=0.5,
+        status_forcelist=[503],
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    ),
+))
+
+# Caps in-flight submissions at the connection pool size: a large batch then
+# reuses the pooled connections instead of opening throwaway ones, and holds at
+# most a few threadpool workers rather than one per invoice.
+_eds_slots = asyncio.Semaphore(EDS_MAX_CONCURRENCY)
 
 def send_invoice_to_eds(xml_bytes: bytes, api_key: str, is_test: bool = False) -> Dict[str, Any]:
     """
@@ -31,7 +62,7 @@ def send_invoice_to_eds(xml_bytes: bytes, api_key: str, is_test: bool = False) -
         # If multipart/form-data is used, we drop the raw Content-Type
         del headers["Content-Type"]
         
-        response = requests.post(
+        response = _eds_session.post(
             VID_EDS_API_URL,
             headers=headers,
             files=files,
@@ -55,3 +86,13 @@ def send_invoice_to_eds(xml_bytes: bytes, api_key: str, is_test: bool = False) -
             "success": False,
             "error": f"Neizdevās savienoties ar VID EDS: {str(e)}"
         }
+
+
+async def send_invoice_to_eds_async(xml_bytes: bytes, api_key: str, is_test: bool = False) -> Dict[str, Any]:
+    """
+    Async wrapper for send_invoice_to_eds. The upload runs in the threadpool, so the
+    event loop stays free and several invoices can be sent with asyncio.gather;
+    at most EDS_MAX_CONCURRENCY of them are in flight at once.
+    """
+    async with _eds_slots:
+        return await run_in_threadpool(send_invoice_to_eds, xml_bytes, api_key, is_test)
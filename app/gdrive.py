@@ -2,61 +2,154 @@
 
 import json
 import logging
+import os
+import threading
+from collections import namedtuple
+from contextlib import ExitStack
 from io import BytesIO
-from typing import Optional
+from typing import IO, Optional, Union
 
+import httplib2
+from google.auth.exceptions import TransportError
 from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import Flow
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseUpload
 
 logger = logging.getLogger(__name__)
 
 SCOPES = ["https://www.googleapis.com/auth/drive.file"]
+UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024  # resumable upload chunk (multiple of 256 KB)
+HTTP_TIMEOUT = 30  # seconds
+HTTP_POOL_SIZE = 4
+
+# Parsed Google Drive settings; rebuilt only when one of the raw values changes
+GDriveConfig = namedtuple("GDriveConfig", "enabled folder_id client_id client_secret refresh_token")
+_GDRIVE_KEYS = ("gdrive_enabled", "gdrive_folder_id", "gdrive_client_id", "gdrive_client_secret", "gdrive_refresh_token")
+_gdrive_cfg_cache: tuple = ((), None)  # (raw values, GDriveConfig)
+
+
+class GDriveTransientError(Exception):
+    """Upload failed for a reason that may clear up on its own (network, 429, 5xx)."""
+
+# Built Drive services keyed by OAuth identity:
+# (client_id, client_secret, refresh_token) -> (credentials, service).
+# Reusing the Credentials means the access token is only refreshed when it
+# actually expires instead of once per upload.
+_SERVICE_CACHE: dict = {}
+_service_cache_lock = threading.Lock()
+
+# Idle authorized transports for the cached credentials. httplib2.Http is not
+# thread-safe, so each upload checks one out exclusively; returning it keeps the
+# keep-alive TLS connections to googleapis.com open for the next upload.
+_http_pool: list = []
+
+# OAuth2 consent flows: (client_id, client_secret, redirect_uri) -> Flow
+_FLOW_CACHE: dict = {}
+_flow_cache_lock = threading.Lock()
+
+
+def _gdrive_cfg(settings: dict) -> GDriveConfig:
+    """Return the parsed Google Drive config for ``settings``."""
+    global _gdrive_cfg_cache
+    raw = tuple(settings.get(key) or "" for key in _GDRIVE_KEYS)
+    cached_raw, cfg = _gdrive_cfg_cache
+    if raw != cached_raw:
+        enabled, folder_id, client_id, client_secret, refresh_token = raw
+        cfg = GDriveConfig(
+            enabled == "true",
+            folder_id.strip(),
+            client_id.strip(),
+            client_secret.strip(),
+            refresh_token.strip(),
+        )
+        _gdrive_cfg_cache = (raw, cfg)
+    return cfg
 
 
-def _get_credentials(settings: dict) -> Optional[Credentials]:
+def _get_credentials(cfg: GDriveConfig) -> Optional[Credentials]:
     """Build OAuth2 credentials from stored settings."""
-    client_id = settings.get("gdrive_client_id", "").strip()
-    client_secret = settings.get("gdrive_client_secret", "").strip()
-    refresh_token = settings.get("gdrive_refresh_token", "").strip()
-
-    if not client_id or not client_secret or not refresh_token:
+    if not cfg.client_id or not cfg.client_secret or not cfg.refresh_token:
         return None
 
     return Credentials(
         token=None,
-        refresh_token=refresh_token,
-        client_id=client_id,
-        client_secret=client_secret,
+        refresh_token=cfg.refresh_token,
+        client_id=cfg.client_id,
+        client_secret=cfg.client_secret,
         token_uri="https://oauth2.googleapis.com/token",
         scopes=SCOPES,
     )
 
 
-def _get_drive_service(settings: dict):
-    """Create a Google Drive API service from OAuth2 credentials."""
-    creds = _get_credentials(settings)
-    if not creds:
-        return None
-    return build("drive", "v3", credentials=creds, cache_discovery=False)
+def _get_drive_service(cfg: GDriveConfig):
+    """Return cached (credentials, Drive API service) for the stored OAuth2 settings."""
+    key = (cfg.client_id, cfg.client_secret, cfg.refresh_token)
+    with _service_cache_lock:
+        cached = _SERVICE_CACHE.get(key)
+        if cached is not None:
+            return cached
+
+        creds = _get_credentials(cfg)
+        if not creds:
+            return None
+        service = build("drive", "v3", credentials=creds, cache_discovery=False, static_discovery=True)
+        # Only one OAuth identity is ever active; drop entries for stale credentials
+        _SERVICE_CACHE.clear()
+        _http_pool.clear()
+        cached = _SERVICE_CACHE[key] = (creds, service)
+        return cached
+
+
+def _acquire_http(creds: Credentials) -> AuthorizedHttp:
+    """Check out a pooled authorized transport for ``creds`` (or create one)."""
+    with _service_cache_lock:
+        while _http_pool:
+            http = _http_pool.pop()
+            if http.credentials is creds:
+                return http
+    return AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+
+
+def _release_http(http: AuthorizedHttp) -> None:
+    with _service_cache_lock:
+        if len(_http_pool) < HTTP_POOL_SIZE:
+            _http_pool.append(http)
+
+
+def _get_flow(client_id: str, client_secret: str, redirect_uri: str) -> Flow:
+    """Return the cached OAuth2 Flow for this client config, creating it on first use.
+
+    Sharing one Flow between get_auth_url and exchange_code also carries the
+    PKCE code verifier generated for the authorization URL over to the token
+    exchange.
+    """
+    key = (client_id, client_secret, redirect_uri)
+    with _flow_cache_lock:
+        flow = _FLOW_CACHE.get(key)
+        if flow is None:
+            flow = Flow.from_client_config(
+                {
+                    "web": {
+                        "client_id": client_id,
+                        "client_secret": client_secret,
+                        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                        "token_uri": "https://oauth2.googleapis.com/token",
+                    }
+                },
+                scopes=SCOPES,
+                redirect_uri=redirect_uri,
+            )
+            _FLOW_CACHE.clear()
+            _FLOW_CACHE[key] = flow
+        return flow
 
 
 def get_auth_url(client_id: str, client_secret: str, redirect_uri: str) -> str:
     """Generate Google OAuth2 authorization URL."""
-    from google_auth_oauthlib.flow import Flow
-
-    flow = Flow.from_client_config(
-        {
-            "web": {
-                "client_id": client_id,
-                "client_secret": client_secret,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
-            }
-        },
-        scopes=SCOPES,
-        redirect_uri=redirect_uri,
-    )
+    flow = _get_flow(client_id, client_secret, redirect_uri)
     auth_url, _ = flow.authorization_url(
         access_type="offline",
         prompt="consent",
@@ -66,66 +159,76 @@ def get_auth_url(client_id: str, client_secret: str, redirect_uri: str) -> str:
 
 def exchange_code(code: str, client_id: str, client_secret: str, redirect_uri: str) -> str:
     """Exchange authorization code for a refresh token."""
-    from google_auth_oauthlib.flow import Flow
-
-    flow = Flow.from_client_config(
-        {
-            "web": {
-                "client_id": client_id,
-                "client_secret": client_secret,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
-            }
-        },
-        scopes=SCOPES,
-        redirect_uri=redirect_uri,
-    )
+    flow = _get_flow(client_id, client_secret, redirect_uri)
     flow.fetch_token(code=code)
     return flow.credentials.refresh_token
 
 
 def upload_to_gdrive(
-    pdf_bytes: bytes,
+    pdf_source: Union[bytes, str, IO[bytes]],
     filename: str,
     settings: dict,
 ) -> Optional[str]:
     """Upload a PDF file to Google Drive.
 
-    Returns the file ID on success, or None on failure.
-    """
-    enabled = settings.get("gdrive_enabled", "false")
-    folder_id = settings.get("gdrive_folder_id", "").strip()
+    ``pdf_source`` may be the PDF bytes, a path to a PDF on disk or a binary
+    file object; paths and file objects are streamed from disk instead of
+    being held in memory.
 
-    if enabled != "true" or not folder_id:
+    Returns the file ID on success, or None on a permanent failure (Drive
+    disabled, missing credentials, bad folder, 4xx). Raises
+    GDriveTransientError when a network error, 429 or 5xx persists past the
+    client's own chunk retries, so the caller may try again later.
+    """
+    cfg = _gdrive_cfg(settings)
+    if not cfg.enabled or not cfg.folder_id:
         return None
 
     try:
-        service = _get_drive_service(settings)
-        if not service:
+        drive = _get_drive_service(cfg)
+        if not drive:
             logger.error("Google Drive: missing OAuth2 credentials")
             return None
+        creds, service = drive
 
         file_metadata = {
             "name": filename,
-            "parents": [folder_id],
+            "parents": [cfg.folder_id],
         }
 
-        media = MediaIoBaseUpload(
-            BytesIO(pdf_bytes),
-            mimetype="application/pdf",
-            resumable=False,
-        )
-
-        file = (
-            service.files()
-            .create(body=file_metadata, media_body=media, fields="id")
-            .execute()
-        )
+        with ExitStack() as stack:
+            if isinstance(pdf_source, (str, os.PathLike)):
+                stream = stack.enter_context(open(pdf_source, "rb"))
+            elif isinstance(pdf_source, (bytes, bytearray)):
+                stream = BytesIO(pdf_source)
+            else:
+                stream = pdf_source
+
+            media = MediaIoBaseUpload(
+                stream,
+                mimetype="application/pdf",
+                resumable=True,
+                chunksize=UPLOAD_CHUNK_SIZE,
+            )
+
+            request = service.files().create(body=file_metadata, media_body=media, fields="id")
+            http = _acquire_http(creds)
+            file = None
+            while file is None:
+                _, file = request.next_chunk(http=http, num_retries=3)
+            _release_http(http)
 
         file_id = file.get("id")
         logger.info(f"PDF uploaded to Google Drive: {filename} (id={file_id})")
         return file_id
 
+    except HttpError as e:
+        if e.resp.status == 429 or e.resp.status >= 500:
+            raise GDriveTransientError(f"Google Drive upload failed for {filename}: {e}") from e
+        logger.error(f"Google Drive upload failed for {filename}: {e}")
+        return None
+    except (httplib2.HttpLib2Error, TransportError, ConnectionError, TimeoutError) as e:
+        raise GDriveTransientError(f"Google Drive upload failed for {filename}: {e}") from e
     except Exception as e:
         logger.error(f"Google Drive upload failed for {filename}: {e}")
         return None
@@ -0,0 +1,28 @@
+"""Conditional GET helpers — ETag / If-None-Match for rarely changing JSON."""
+
+import hashlib
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+CACHE_CONTROL = "private, max-age=0, must-revalidate"
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" are the same representation for a GET
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def etag_json_response(request: Request, payload: BaseModel) -> Response:
+    """Serialize ``payload`` with an ETag; answer 304 if the browser already has it."""
+    body = payload.model_dump_json().encode()
+    etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
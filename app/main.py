@@ -5,6 +5,8 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, RedirectResponse, JSONResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+import hashlib
 import os
 import sys
 import logging
@@ -13,54 +15,133 @@ import logging
 if os.environ.get("ENVIRONMENT", "development") != "production":
     os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-from .database import engine, get_db
+from .database import DATABASE_PATH, engine, get_db
 from .models import Base
 from . import crud, schemas, auth
 from .auth import get_current_user, authenticate_user, create_access_token, Token, LoginRequest
+from .gdrive import exchange_code, get_auth_url
+from .http_cache import etag_json_response
 from .routers import clients, invoices, services
+from .utils import send_test_email
+
+SCHEMA_STAMP_KEY = "schema_version_seen"
+# Bump whenever _migrate_schema gains a step that the models don't describe
+MIGRATIONS_REVISION = 1
+
+# Trigram full-text index over client name / reg. number for substring search.
+# External-content table: rows live in `clients`, triggers keep the index in sync.
+_CLIENTS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5("
+    "name, reg_number, content='clients', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS clients_fts_ai AFTER INSERT ON clients BEGIN "
+    "INSERT INTO clients_fts(rowid, name, reg_number) VALUES (new.id, new.name, new.reg_number); END",
+    "CREATE TRIGGER IF NOT EXISTS clients_fts_ad AFTER DELETE ON clients BEGIN "
+    "INSERT INTO clients_fts(clients_fts, rowid, name, reg_number) VALUES ('delete', old.id, old.name, old.reg_number); END",
+    "CREATE TRIGGER IF NOT EXISTS clients_fts_au AFTER UPDATE ON clients BEGIN "
+    "INSERT INTO clients_fts(clients_fts, rowid, name, reg_number) VALUES ('delete', old.id, old.name, old.reg_number); "
+    "INSERT INTO clients_fts(rowid, name, reg_number) VALUES (new.id, new.name, new.reg_number); END",
+    "INSERT INTO clients_fts(clients_fts) VALUES ('rebuild')",
+]
+
+
+# (table, column, column DDL) for columns added to existing databases
+_ADDED_COLUMNS = [
+    ("clients", "postal_code", 'VARCHAR(20) DEFAULT ""'),
+    ("clients", "email", 'VARCHAR(255) DEFAULT ""'),
+    ("services", "vat_rate", "FLOAT DEFAULT 21.0"),
+]
+
+
+def _model_schema_fingerprint() -> str:
+    """Short hash of the tables, columns and indexes declared in models.py."""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{col.name}:{col.type!r}" for col in table.columns)
+        parts.extend(sorted(index.name for index in table.indexes))
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+
+def _schema_stamp(conn) -> str:
+    # schema_version changes on every DDL statement; the fingerprint changes when the models do
+    schema_version = conn.exec_driver_sql("PRAGMA schema_version").scalar()
+    return f"{schema_version}:{_model_schema_fingerprint()}:{MIGRATIONS_REVISION}"
+
+
+def _migrate_schema(conn):
+    """Create missing tables/columns/indexes (SQLite doesn't do this via create_all)."""
+    from sqlalchemy.schema import CreateIndex
+
+    # Create all tables
+    Base.metadata.create_all(bind=conn)
+
+    # Columns added after the first release; tables created above already have them
+    tables = sorted({table_name for table_name, _, _ in _ADDED_COLUMNS})
+    existing = set(conn.exec_driver_sql(
+        "SELECT m.name, p.name FROM sqlite_master AS m, pragma_table_info(m.name) AS p "
+        f"WHERE m.type = 'table' AND m.name IN ({', '.join('?' * len(tables))})",
+        tuple(tables),
+    ).fetchall())
+    for table_name, column_name, ddl in _ADDED_COLUMNS:
+        if (table_name, column_name) not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}")
+
+    # create_all() skips existing tables, so add indexes introduced later
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+    # Client search index; needs SQLite >= 3.34 with FTS5 — crud falls back to LIKE without it
+    try:
+        for stmt in _CLIENTS_FTS_DDL:
+            conn.exec_driver_sql(stmt)
+    except Exception as e:
+        print(f"Client full-text index unavailable: {e}")
 
-# Create all tables on startup
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Invoice Manager", version="1.0.0")
+def _run_migrations():
+    """Auto-migrate the DB schema for existing databases.
 
-@app.on_event("startup")
-def startup_event():
-    from .database import SessionLocal
-    from . import models, auth
+    Skipped entirely when neither the database schema nor the models changed
+    since the last successful run.
+    """
     from sqlalchemy import text
-    
-    # Auto-migrate DB schema for existing databases (SQLite doesn't do this via create_all)
+    from sqlalchemy.exc import OperationalError
+
     try:
         with engine.begin() as conn:
-            # Check clients table
-            res = conn.execute(text("PRAGMA table_info(clients)")).fetchall()
-            columns = [row[1] for row in res]
-            if "postal_code" not in columns and len(columns) > 0:
-                conn.execute(text('ALTER TABLE clients ADD COLUMN postal_code VARCHAR(20) DEFAULT ""'))
-            if "email" not in columns and len(columns) > 0:
-                conn.execute(text('ALTER TABLE clients ADD COLUMN email VARCHAR(255) DEFAULT ""'))
-                
-            # Check services table
-            res = conn.execute(text("PRAGMA table_info(services)")).fetchall()
-            columns = [row[1] for row in res]
-            if "vat_rate" not in columns and len(columns) > 0:
-                conn.execute(text('ALTER TABLE services ADD COLUMN vat_rate FLOAT DEFAULT 21.0'))
-        print("Database schemas verified and migrated.")
+            try:
+                seen = conn.execute(
+                    text("SELECT value FROM settings WHERE key = :key"), {"key": SCHEMA_STAMP_KEY}
+                ).scalar()
+            except OperationalError:  # fresh database, no settings table yet
+                seen = None
+
+            if seen != _schema_stamp(conn):
+                _migrate_schema(conn)
+                conn.execute(
+                    text("INSERT INTO settings (key, value) VALUES (:key, :value) "
+                         "ON CONFLICT(key) DO UPDATE SET value = excluded.value"),
+                    {"key": SCHEMA_STAMP_KEY, "value": _schema_stamp(conn)},
+                )
+                print("Database schemas verified and migrated.")
     except Exception as e:
         print(f"Error migrating DB schema: {e}")
 
+
+def _ensure_default_user():
+    from .database import SessionLocal
+    from . import models, auth
+
     db = SessionLocal()
     try:
-        # Check if any user exists
-        user_count = db.query(models.User).count()
-        if user_count == 0:
+        # Check if any user exists (SELECT ... LIMIT 1 instead of counting them all)
+        if db.query(models.User.id).first() is None:
             print("Creating default admin user...")
             hashed_pw = auth.get_password_hash("admin123")
             admin = models.User(
                 username="admin",
                 password_hash=hashed_pw,
-                is_active=True
             )
             db.add(admin)
             db.commit()
@@ -70,6 +151,32 @@ def startup_event():
     finally:
         db.close()
 
+
+def _optimize_db():
+    """Let SQLite refresh planner statistics (sqlite_stat1) where it thinks it helps."""
+    try:
+        with engine.begin() as conn:
+            # Cap the rows ANALYZE samples per index so this stays cheap on large tables
+            conn.exec_driver_sql("PRAGMA analysis_limit=1000")
+            conn.exec_driver_sql("PRAGMA optimize")
+    except Exception as e:
+        print(f"Error optimizing database: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Multi-worker deployments migrate once up front and start the workers
+    # with RUN_MIGRATIONS=0 so they don't all queue on the schema work
+    if os.environ.get("RUN_MIGRATIONS", "1") == "1":
+        _run_migrations()
+    _ensure_default_user()
+    _optimize_db()
+    yield
+    _optimize_db()
+
+
+app = FastAPI(title="Invoice Manager", version="1.0.0", lifespan=lifespan)
+
 # Mount static files — resolve correct path for both dev and frozen EXE
 if getattr(sys, 'frozen', False):
     _base_dir = os.path.join(sys._MEIPASS, "app")
@@ -109,7 +216,7 @@ def update_profile(
     return {"detail": "Profils atjaunināts", "username": user.username}
 
 
-@app.get("/api/auth/me")
+@app.get("/api/auth/me", response_model=schemas.CurrentUser)
 def auth_me(user: str = Depends(get_current_user)):
     return {"username": user}
 
@@ -117,13 +224,13 @@ def auth_me(user: str = Depends(get_current_user)):
 # ── Settings endpoints (protected) ───────────────────────────────────
 
 @app.get("/api/settings", response_model=schemas.SettingsRead)
-def read_settings(db: Session = Depends(get_db), user: str = Depends(get_current_user)):
-    return crud.get_settings(db)
+def read_settings(request: Request, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
+    return etag_json_response(request, schemas.SettingsRead.model_validate(crud.get_settings(db)))
 
 
 @app.get("/api/stats", response_model=schemas.DashboardStats)
-def get_dashboard_stats(db: Session = Depends(get_db), user: str = Depends(get_current_user)):
-    return crud.get_stats(db)
+def get_dashboard_stats(request: Request, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
+    return etag_json_response(request, schemas.DashboardStats.model_validate(crud.get_stats(db)))
 
 
 @app.put("/api/settings", response_model=schemas.SettingsRead)
@@ -139,7 +246,6 @@ class TestEmailRequest(BaseModel):
 async def test_email(payload: TestEmailRequest, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
     """Send a test email using current SMTP settings."""
     settings = crud.get_settings(db)
-    from .utils import send_test_email
     try:
         await send_test_email(settings, payload.to_email)
     except Exception as e:
@@ -151,10 +257,13 @@ async def test_email(payload: TestEmailRequest, db: Session = Depends(get_db), u
 @app.get("/api/backup/export")
 def export_backup(user: str = Depends(get_current_user)):
     """Export the database file as a download."""
-    from .database import DATA_DIR
-    db_path = os.path.join(DATA_DIR, "invoices.db")
+    db_path = DATABASE_PATH
     if not os.path.exists(db_path):
         return JSONResponse(status_code=404, content={"detail": "Database file not found"})
+
+    # WAL mode keeps recent commits in invoices.db-wal — fold them into the main file first
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
     
     return FileResponse(
         path=db_path,
@@ -168,7 +277,6 @@ def export_backup(user: str = Depends(get_current_user)):
 @app.get("/api/gdrive/auth")
 def gdrive_auth(request: Request, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
     """Redirect user to Google consent screen."""
-    from .gdrive import get_auth_url
     settings = crud.get_settings(db)
     client_id = settings.get("gdrive_client_id", "").strip()
     client_secret = settings.get("gdrive_client_secret", "").strip()
@@ -183,7 +291,6 @@ def gdrive_auth(request: Request, db: Session = Depends(get_db), user: str = Dep
 @app.get("/api/gdrive/callback")
 def gdrive_callback(code: str, request: Request, db: Session = Depends(get_db)):
     """Handle Google OAuth2 callback — exchange code for refresh token."""
-    from .gdrive import exchange_code
     settings = crud.get_settings(db)
     client_id = settings.get("gdrive_client_id", "").strip()
     client_secret = settings.get("gdrive_client_secret", "").strip()
@@ -1,10 +1,19 @@
 from sqlalchemy import (
-    Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean, func
+    Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean, Index, func
 )
 from sqlalchemy.orm import relationship
 from .database import Base
 
 
+def line_amounts(quantity: float, unit_price: float, vat_rate: float) -> tuple:
+    """(line total, line VAT) of one invoice line, each rounded to cents.
+
+    Every invoice total is the sum of these per-line amounts; the list endpoint
+    and the PDF sum them inline, so all of them share this one rounding rule.
+    """
+    line_total = round(quantity * unit_price, 2)
+    return line_total, round(line_total * vat_rate / 100, 2)
+
 
 class User(Base):
     """Application users (admins)."""
@@ -30,7 +39,7 @@ class Client(Base):
     __tablename__ = "clients"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(255), nullable=False)
+    name = Column(String(255), nullable=False, index=True)
     reg_number = Column(String(50), default="")
     vat_number = Column(String(50), default="")
     legal_address = Column(String(500), default="")
@@ -49,7 +58,7 @@ class Service(Base):
     __tablename__ = "services"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(500), nullable=False)
+    name = Column(String(500), nullable=False, index=True)
     unit = Column(String(50), default="gab.")
     default_price = Column(Float, default=0)
     vat_rate = Column(Float, default=21)  # 0 or 21
@@ -58,10 +67,14 @@ class Service(Base):
 
 class Invoice(Base):
     __tablename__ = "invoices"
+    __table_args__ = (
+        # Status filter + date range filter in get_invoices / get_stats
+        Index("ix_invoices_status_date", "status", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     invoice_number = Column(String(20), unique=True, nullable=False, index=True)
-    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False, index=True)
     date = Column(Date, nullable=False)
     due_date = Column(Date, nullable=False)
     issuer_name = Column(String(255), default="")
@@ -73,25 +86,39 @@ class Invoice(Base):
     client = relationship("Client", back_populates="invoices")
     items = relationship("InvoiceItem", back_populates="invoice", cascade="all, delete-orphan")
 
+    def compute_totals(self) -> tuple:
+        """(subtotal, vat_amount) in one pass over the items.
+
+        Uses line_amounts directly rather than InvoiceItem.total / .vat_amount,
+        so listing N invoices doesn't go through the property chain per line.
+        """
+        subtotal = vat = 0.0
+        for item in self.items:
+            line_total, line_vat = line_amounts(item.quantity, item.unit_price, item.vat_rate)
+            subtotal += line_total
+            vat += line_vat
+        return round(subtotal, 2), round(vat, 2)
+
     @property
     def subtotal(self) -> float:
-        return round(sum(item.total for item in self.items), 2)
+        return self.compute_totals()[0]
 
     @property
     def vat_amount(self) -> float:
         """Sum of VAT per each line item (supports mixed rates)."""
-        return round(sum(item.vat_amount for item in self.items), 2)
+        return self.compute_totals()[1]
 
     @property
     def grand_total(self) -> float:
-        return round(self.subtotal + self.vat_amount, 2)
+        subtotal, vat = self.compute_totals()
+        return round(subtotal + vat, 2)
 
 
 class InvoiceItem(Base):
     __tablename__ = "invoice_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    invoice_id = Column(Integer, ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False)
+    invoice_id = Column(Integer, ForeignKey("invoices.id", ondelete="CASCADE"), nullable=False, index=True)
     description = Column(String(500), nullable=False)
     unit = Column(String(50), default="gab.")
     quantity = Column(Float, nullable=False, default=1)
@@ -102,11 +129,11 @@ class InvoiceItem(Base):
 
     @property
     def total(self) -> float:
-        return round(self.quantity * self.unit_price, 2)
+        return line_amounts(self.quantity, self.unit_price, self.vat_rate)[0]
 
     @property
     def vat_amount(self) -> float:
-        return round(self.total * self.vat_rate / 100, 2)
+        return line_amounts(self.quantity, self.unit_price, self.vat_rate)[1]
 
     @property
     def total_with_vat(self) -> float:
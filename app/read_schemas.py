@@ -0,0 +1,73 @@
+"""Read-side shapes for the invoice list — plain dicts encoded by pydantic-core.
+
+The list endpoint is the one the UI calls most. Its rows come straight from our
+own database, so instead of building a Pydantic model per invoice, client and
+line, the router builds plain dicts and encodes the whole page in one
+``dump_json`` call. The fields (and their order) mirror schemas.InvoiceRead,
+which remains the documented response model; input validation stays on the
+Pydantic models in schemas.py.
+"""
+
+from datetime import date
+from typing import List, Optional
+
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict
+
+
+class ClientRow(TypedDict):
+    name: str
+    reg_number: Optional[str]
+    vat_number: Optional[str]
+    legal_address: Optional[str]
+    bank_name: Optional[str]
+    bank_swift: Optional[str]
+    bank_account: Optional[str]
+    postal_code: Optional[str]
+    email: Optional[str]
+    id: int
+
+
+class InvoiceItemRow(TypedDict):
+    description: str
+    unit: Optional[str]
+    quantity: float
+    unit_price: float
+    vat_rate: float
+    id: int
+    total: float
+    vat_amount: float
+    total_with_vat: float
+
+
+class InvoiceRow(TypedDict):
+    client_id: int
+    date: date
+    due_date: date
+    issuer_name: Optional[str]
+    notes: Optional[str]
+    id: int
+    invoice_number: str
+    status: str
+    subtotal: float
+    vat_amount: float
+    grand_total: float
+    items: List[InvoiceItemRow]
+    client: Optional[ClientRow]
+
+
+class InvoicePage(TypedDict):
+    items: List[InvoiceRow]
+    total: int
+    page: int
+    size: int
+    pages: int
+
+
+# Built once; serializing with it never validates
+_invoice_page_adapter = TypeAdapter(InvoicePage)
+
+
+def dump_invoice_page(page: InvoicePage) -> bytes:
+    """Encode an invoice list page as JSON bytes."""
+    return _invoice_page_adapter.dump_json(page)
@@ -1,11 +1,13 @@
 """Client API endpoints."""
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..auth import get_current_user
+from ..http_cache import etag_json_response
 from .. import crud, schemas
+from ..utils import fetch_company_data, search_companies
 
 router = APIRouter(prefix="/api/clients", tags=["clients"])
 
@@ -18,14 +20,16 @@ def list_clients(
     db: Session = Depends(get_db), 
     user: str = Depends(get_current_user)
 ):
-    return crud.get_clients(db, page=page, size=size, search=search)
+    data = crud.get_clients(db, page=page, size=size, search=search)
+    # Validate and serialize here; returning a Response skips FastAPI doing the
+    # same again on an extra threadpool hop
+    page_model = schemas.PaginatedClients.model_validate(data, from_attributes=True)
+    return Response(content=page_model.model_dump_json(), media_type="application/json")
 
 
 @router.get("/lookup/{reg_number}")
 def lookup_company(reg_number: str, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
     """Lookup company data by registration number."""
-    from ..utils import fetch_company_data
-    
     data = fetch_company_data(reg_number)
     if not data:
         raise HTTPException(status_code=404, detail="Company not found or API error")
@@ -36,17 +40,15 @@ def lookup_company(reg_number: str, db: Session = Depends(get_db), user: str = D
 @router.get("/search")
 def search_clients_api(q: str, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
     """Search companies by name (autocomplete)."""
-    from ..utils import search_companies
-    
     return search_companies(q)
 
 
 @router.get("/{client_id}", response_model=schemas.ClientRead)
-def read_client(client_id: int, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
+def read_client(client_id: int, request: Request, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
     client = crud.get_client(db, client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
-    return client
+    return etag_json_response(request, schemas.ClientRead.model_validate(client))
 
 
 @router.post("", response_model=schemas.ClientRead, status_code=201)
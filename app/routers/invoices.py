@@ -1,20 +1,36 @@
 """Invoice API endpoints."""
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
 from typing import List, Optional
 from datetime import date
 from pydantic import BaseModel
-import csv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
 import io
+import logging
 import os
+import time
+import zipfile
 
-from ..database import get_db
+from ..database import SessionLocal, get_db
 from ..auth import get_current_user
-from .. import crud, schemas
-from ..utils import number_to_words_lv
+from .. import crud, models, schemas
+from ..e_invoice import generate_peppol_xml
+from ..eds_api import send_invoice_to_eds_async
+from ..read_schemas import InvoiceRow, dump_invoice_page
+from ..gdrive import GDriveTransientError, upload_to_gdrive
+from ..utils import (
+    generate_invoice_number,
+    generate_invoices_pdf_bulk,
+    get_invoice_pdf_cached,
+    number_to_words_lv,
+    send_invoice_email,
+)
 
 import sys
 
@@ -27,15 +43,80 @@ else:
     _base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 _template_dir = os.path.join(_base_dir, "templates")
 templates = Jinja2Templates(directory=_template_dir)
+# Templates ship with the app and never change at runtime — skip the
+# per-render mtime check and resolve the invoice template only once
+templates.env.auto_reload = False
+_invoice_template = templates.get_template("invoice.html")
 
 
-@router.get("/next-number")
+def get_request_settings(db: Session = Depends(get_db)) -> dict:
+    """Settings dependency. FastAPI caches dependency results per request, so
+    the settings are looked up at most once however many times they are used."""
+    return crud.get_settings(db)
+
+
+@router.get("/next-number", response_model=schemas.NextInvoiceNumber)
 def get_next_invoice_number(db: Session = Depends(get_db), user: str = Depends(get_current_user)):
     """Preview the next invoice number that will be assigned."""
-    from ..utils import generate_invoice_number
     number = generate_invoice_number(db)
     return {"next_number": number}
 
+
+def _invoice_row(inv: models.Invoice) -> InvoiceRow:
+    """One invoice as a plain dict shaped like schemas.InvoiceRead.
+
+    Line amounts and the invoice totals are summed in the same pass over the
+    items (see models.line_amounts). Endpoints returning a single invoice use
+    it too: serializing the model itself would read subtotal, vat_amount and
+    grand_total separately, each walking all items again.
+    """
+    client = inv.client
+    line_items = []
+    subtotal = vat_amount = 0.0
+    for item in inv.items:
+        line_total, line_vat = models.line_amounts(item.quantity, item.unit_price, item.vat_rate)
+        subtotal += line_total
+        vat_amount += line_vat
+        line_items.append({
+            "description": item.description,
+            "unit": item.unit,
+            "quantity": item.quantity,
+            "unit_price": item.unit_price,
+            "vat_rate": item.vat_rate,
+            "id": item.id,
+            "total": line_total,
+            "vat_amount": line_vat,
+            "total_with_vat": round(line_total + line_vat, 2),
+        })
+    subtotal, vat_amount = round(subtotal, 2), round(vat_amount, 2)
+    return {
+        "client_id": inv.client_id,
+        "date": inv.date,
+        "due_date": inv.due_date,
+        "issuer_name": inv.issuer_name or "",
+        "notes": inv.notes or "",
+        "id": inv.id,
+        "invoice_number": inv.invoice_number,
+        "status": inv.status or "sent",
+        "subtotal": subtotal,
+        "vat_amount": vat_amount,
+        "grand_total": round(subtotal + vat_amount, 2),
+        "items": line_items,
+        "client": {
+            "name": client.name,
+            "reg_number": client.reg_number or "",
+            "vat_number": client.vat_number or "",
+            "legal_address": client.legal_address or "",
+            "bank_name": client.bank_name or "",
+            "bank_swift": client.bank_swift or "",
+            "bank_account": client.bank_account or "",
+            "postal_code": client.postal_code or "",
+            "email": client.email or "",
+            "id": client.id,
+        } if client else None,
+    }
+
+
 @router.get("", response_model=schemas.PaginatedInvoices)
 def list_invoices(
     page: int = 1, 
@@ -52,55 +133,22 @@ def list_invoices(
         data = crud.get_invoices(db, page=page, size=size, search=search,
                                   status=status, date_from=date_from, date_to=date_to)
         
-        # Manual serialization to ensure no Pydantic/ORM conflicts
-        # This is the safest way to ensure data reaches the frontend
-        serialized_items = []
-        for inv in data["items"]:
-            serialized_items.append({
-                "id": inv.id,
-                "invoice_number": inv.invoice_number,
-                "client_id": inv.client_id,
-                "client": {
-                    "id": inv.client.id,
-                    "name": inv.client.name,
-                    "reg_number": inv.client.reg_number or "",
-                    "vat_number": inv.client.vat_number or "",
-                    "legal_address": inv.client.legal_address or "",
-                    "bank_name": inv.client.bank_name or "",
-                    "bank_swift": inv.client.bank_swift or "",
-                    "bank_account": inv.client.bank_account or "",
-                    "email": inv.client.email or ""
-                } if inv.client else None,
-                "date": inv.date,
-                "due_date": inv.due_date,
-                "issuer_name": inv.issuer_name or "",
-                "notes": inv.notes or "",
-                "status": inv.status or "sent",
-                "subtotal": inv.subtotal,
-                "vat_amount": inv.vat_amount,
-                "grand_total": inv.grand_total,
-                "items": [
-                    {
-                        "id": item.id,
-                        "description": item.description,
-                        "unit": item.unit,
-                        "quantity": item.quantity,
-                        "unit_price": item.unit_price,
-                        "vat_rate": item.vat_rate,
-                        "total": item.total,
-                        "vat_amount": item.vat_amount,
-                        "total_with_vat": item.total_with_vat
-                    } for item in inv.items
-                ]
-            })
-            
-        return {
-            "items": serialized_items,
-            "total": data["total"],
-            "page": data["page"],
-            "size": data["size"],
-            "pages": data["pages"]
-        }
+        # Plain dicts shaped like schemas.InvoiceRead (see read_schemas): the
+        # rows come straight from our own DB, so there is nothing to validate
+        # and no need for a model instance per invoice, client and line.
+        rows = [_invoice_row(inv) for inv in data["items"]]
+
+        # Returning a Response skips FastAPI's own validation pass
+        return Response(
+            content=dump_invoice_page({
+                "items": rows,
+                "total": data["total"],
+                "page": data["page"],
+                "size": data["size"],
+                "pages": data["pages"],
+            }),
+            media_type="application/json",
+        )
 
     except Exception as e:
         import traceback
@@ -118,33 +166,24 @@ def read_invoice(invoice_id: int, db: Session = Depends(get_db), user: str = Dep
     invoice = crud.get_invoice(db, invoice_id)
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
-    return invoice
+    return _invoice_row(invoice)
 
 
 @router.post("", response_model=schemas.InvoiceRead, status_code=201)
-def create_invoice(data: schemas.InvoiceCreate, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
+def create_invoice(
+    data: schemas.InvoiceCreate,
+    background: BackgroundTasks,
+    db: Session = Depends(get_db),
+    settings: dict = Depends(get_request_settings),
+    user: str = Depends(get_current_user)
+):
     invoice = crud.create_invoice(db, data)
     
-    # Auto-upload PDF to Google Drive (background)
-    settings = crud.get_settings(db)
+    # Auto-upload PDF to Google Drive once the response has been sent
     if settings.get("gdrive_enabled") == "true":
-        try:
-            from ..utils import generate_invoice_pdf
-            from ..gdrive import upload_to_gdrive
-            import threading
-            
-            pdf_bytes = generate_invoice_pdf(invoice, settings)
-            filename = f"Invoice-{invoice.invoice_number}.pdf"
-            threading.Thread(
-                target=upload_to_gdrive,
-                args=(pdf_bytes, filename, settings),
-                daemon=True,
-            ).start()
-        except Exception as e:
-            import logging
-            logging.getLogger(__name__).error(f"Google Drive auto-upload failed: {e}")
+        background.add_task(_upload_invoice_pdf_task, invoice.id, settings)
     
-    return invoice
+    return _invoice_row(invoice)
 
 
 @router.put("/{invoice_id}", response_model=schemas.InvoiceRead)
@@ -152,7 +191,7 @@ def update_invoice(invoice_id: int, data: schemas.InvoiceUpdate, db: Session = D
     invoice = crud.update_invoice(db, invoice_id, data)
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
-    return invoice
+    return _invoice_row(invoice)
 
 
 @router.delete("/{invoice_id}")
@@ -166,62 +205,115 @@ class BulkDeleteRequest(BaseModel):
 
 @router.post("/bulk-delete")
 def delete_invoices_bulk(req: BulkDeleteRequest, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
-    deleted_count = 0
-    for iid in req.invoice_ids:
-        if crud.delete_invoice(db, iid):
-            deleted_count += 1
-    return {"deleted": deleted_count}
+    return {"deleted": crud.delete_invoices(db, req.invoice_ids)}
 
 
 @router.get("/{invoice_id}/html", response_class=HTMLResponse)
-def render_invoice(invoice_id: int, request: Request, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
+def render_invoice(
+    invoice_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    settings: dict = Depends(get_request_settings),
+    user: str = Depends(get_current_user)
+):
     """Render the invoice as a styled HTML page (for printing / PDF)."""
     invoice = crud.get_invoice(db, invoice_id)
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
 
-    settings = crud.get_settings(db)
     total_words = number_to_words_lv(invoice.grand_total)
     vat_enabled = settings.get("vat_enabled", "true") == "true"
 
-    return templates.TemplateResponse("invoice.html", {
-        "request": request,
-        "invoice": invoice,
-        "settings": settings,
-        "total_words": total_words,
-        "vat_enabled": vat_enabled,
-    })
+    return HTMLResponse(_invoice_template.render(
+        request=request,
+        invoice=invoice,
+        settings=settings,
+        total_words=total_words,
+        vat_enabled=vat_enabled,
+    ))
+
 
 
+CSV_HEADER = ["Nr.", "Klients", "Datums", "Apmaksas termiņš", "Summa bez PVN", "PVN", "Kopā", "Statuss"]
+CSV_BATCH_SIZE = 500
+# Same output as csv.writer's defaults (QUOTE_MINIMAL, "\r\n" line endings).
+# Only the free-text fields can need quoting; dates and amounts never do.
+# printf-style formatting with the dates passed as day/month/year integers is
+# several times faster per row than str.format with date.__format__/strftime.
+CSV_ROW_TEMPLATE = "%s,%s,%02d.%02d.%d,%02d.%02d.%d,%.2f,%.2f,%.2f,%s\r\n"
+
+
+def _csv_field(value: str) -> str:
+    """Quote a CSV field the way csv.QUOTE_MINIMAL would."""
+    if any(c in value for c in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+CSV_HEADER_BYTES = (",".join(CSV_HEADER) + "\r\n").encode("utf-8")
+
+
+def _iter_invoices_csv(invoice_ids: Optional[List[int]] = None):
+    """Yield the invoices CSV as UTF-8 chunks of up to CSV_BATCH_SIZE rows.
+
+    Invoices are fetched in batches of CSV_BATCH_SIZE rows, so memory stays
+    flat however many invoices there are. The generator runs while the
+    response is being sent, after the request's own session may already be
+    closed, so it uses a session of its own.
+    """
+    db = SessionLocal()
+    try:
+        # Only the columns the CSV shows (and the totals need) are loaded —
+        # notes, the client's addresses and bank details stay in the database
+        query = (
+            db.query(models.Invoice)
+            .options(
+                load_only(
+                    models.Invoice.invoice_number, models.Invoice.date,
+                    models.Invoice.due_date, models.Invoice.status,
+                ),
+                joinedload(models.Invoice.client).load_only(models.Client.name),
+                selectinload(models.Invoice.items).load_only(
+                    models.InvoiceItem.quantity, models.InvoiceItem.unit_price,
+                    models.InvoiceItem.vat_rate,
+                ),
+            )
+            .order_by(models.Invoice.id.desc())
+        )
+        if invoice_ids is not None:
+            query = query.filter(models.Invoice.id.in_(invoice_ids))
+
+        yield CSV_HEADER_BYTES
+        # Starlette pulls every chunk of a sync iterator through the threadpool,
+        # so rows are joined and encoded once per batch rather than per row
+        rows = []
+        for inv in query.yield_per(CSV_BATCH_SIZE):
+            subtotal, vat_amount = inv.compute_totals()
+            issued, due = inv.date, inv.due_date
+            rows.append(CSV_ROW_TEMPLATE % (
+                _csv_field(inv.invoice_number),
+                _csv_field(inv.client.name) if inv.client else "",
+                issued.day, issued.month, issued.year,
+                due.day, due.month, due.year,
+                subtotal,
+                vat_amount,
+                round(subtotal + vat_amount, 2),
+                _csv_field(inv.status or ""),
+            ))
+            if len(rows) >= CSV_BATCH_SIZE:
+                yield "".join(rows).encode("utf-8")
+                rows.clear()
+        if rows:
+            yield "".join(rows).encode("utf-8")
+    finally:
+        db.close()
+
 
 @router.get("/export/csv")
-def export_invoices_csv(db: Session = Depends(get_db), user: str = Depends(get_current_user)):
+def export_invoices_csv(user: str = Depends(get_current_user)):
     """Export all invoices as a CSV file."""
-    from sqlalchemy.orm import joinedload
-    from .. import models
-    invoices = (
-        db.query(models.Invoice)
-        .options(joinedload(models.Invoice.client))
-        .order_by(models.Invoice.id.desc())
-        .all()
-    )
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Nr.", "Klients", "Datums", "Apmaksas termiņš", "Summa bez PVN", "PVN", "Kopā", "Statuss"])
-    for inv in invoices:
-        writer.writerow([
-            inv.invoice_number,
-            inv.client.name if inv.client else "",
-            inv.date.strftime("%d.%m.%Y"),
-            inv.due_date.strftime("%d.%m.%Y"),
-            f"{inv.subtotal:.2f}",
-            f"{inv.vat_amount:.2f}",
-            f"{inv.grand_total:.2f}",
-            inv.status
-        ])
-    output.seek(0)
     return StreamingResponse(
-        iter([output.getvalue()]),
+        _iter_invoices_csv(),
         media_type="text/csv; charset=utf-8",
         headers={"Content-Disposition": "attachment; filename=invoices.csv"}
     )
@@ -233,67 +325,47 @@ class ExportXMLRequest(BaseModel):
     invoice_ids: List[int]
 
 @router.post("/export/csv/bulk")
-def export_invoices_csv_bulk(req: ExportXMLRequest, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
+def export_invoices_csv_bulk(req: ExportXMLRequest, user: str = Depends(get_current_user)):
     """Export selected invoices as a CSV file."""
-    from sqlalchemy.orm import joinedload
-    from .. import models
-    invoices = (
-        db.query(models.Invoice)
-        .options(joinedload(models.Invoice.client))
-        .filter(models.Invoice.id.in_(req.invoice_ids))
-        .order_by(models.Invoice.id.desc())
-        .all()
-    )
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Nr.", "Klients", "Datums", "Apmaksas termiņš", "Summa bez PVN", "PVN", "Kopā", "Statuss"])
-    for inv in invoices:
-        writer.writerow([
-            inv.invoice_number,
-            inv.client.name if inv.client else "",
-            inv.date.strftime("%d.%m.%Y"),
-            inv.due_date.strftime("%d.%m.%Y"),
-            f"{inv.subtotal:.2f}",
-            f"{inv.vat_amount:.2f}",
-            f"{inv.grand_total:.2f}",
-            inv.status
-        ])
-    output.seek(0)
     return StreamingResponse(
-        iter([output.getvalue()]),
+        _iter_invoices_csv(req.invoice_ids),
         media_type="text/csv; charset=utf-8",
         headers={"Content-Disposition": "attachment; filename=invoices_selected.csv"}
     )
 
+def _build_peppol_payloads(db: Session, invoice_ids: List[int], settings: dict) -> List[tuple]:
+    """Load invoices and render their PEPPOL XML. Returns [(invoice_number, xml_bytes)]."""
+    return [
+        (invoice.invoice_number, generate_peppol_xml(invoice, invoice.client, settings))
+        for invoice in crud.get_invoices_by_ids(db, invoice_ids)
+    ]
+
+
 @router.post("/send-eds")
-def send_invoices_eds(
+async def send_invoices_eds(
     req: ExportXMLRequest,
     db: Session = Depends(get_db),
+    settings: dict = Depends(get_request_settings),
     user: str = Depends(get_current_user)
 ):
     """Sutit iezimetos rekinus pa taisno uz VID EDS."""
-    settings = crud.get_settings(db)
-    from ..e_invoice import generate_peppol_xml
-    from ..eds_api import send_invoice_to_eds
-    
     eds_api_key = settings.get("eds_api_key", "").strip()
     if not eds_api_key:
         raise HTTPException(status_code=400, detail="EDS API atslēga nav konfigurēta iestatījumos.")
-        
+
+    payloads = await run_in_threadpool(_build_peppol_payloads, db, req.invoice_ids, settings)
+    # Uploads are I/O bound — send them concurrently
+    results = await asyncio.gather(*(
+        send_invoice_to_eds_async(xml_bytes, eds_api_key) for _, xml_bytes in payloads
+    ))
+
     success_count = 0
     errors = []
-    
-    for inv_id in req.invoice_ids:
-        invoice = crud.get_invoice(db, inv_id)
-        if invoice:
-            client = invoice.client
-            xml_bytes = generate_peppol_xml(invoice, client, settings)
-            
-            res = send_invoice_to_eds(xml_bytes, eds_api_key)
-            if res.get("success"):
-                success_count += 1
-            else:
-                errors.append({"invoice_id": invoice.invoice_number, "error": res.get("error")})
+    for (invoice_number, _), res in zip(payloads, results):
+        if res.get("success"):
+            success_count += 1
+        else:
+            errors.append({"invoice_id": invoice_number, "error": res.get("error")})
                 
     return {
         "success_count": success_count,
@@ -301,60 +373,104 @@ def send_invoices_eds(
         "errors": errors
     }
 
+XML_ZIP_BATCH_SIZE = 50
+
+
+class _ZipChunkWriter(io.RawIOBase):
+    """Write-only, non-seekable sink for zipfile; drain() hands out what was written.
+
+    Because it cannot seek, zipfile streams each entry with a trailing data
+    descriptor instead of going back to patch its header.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _iter_invoices_xml_zip(invoice_ids: List[int], settings: dict, prefix: str):
+    """Yield a zip of PEPPOL XML e-invoices, one entry at a time.
+
+    Invoices are loaded XML_ZIP_BATCH_SIZE at a time with a session of the
+    generator's own (it outlives the request's session), so only the current
+    batch and entry are held in memory.
+    """
+    sink = _ZipChunkWriter()
+    db = SessionLocal()
+    try:
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED, False) as zip_file:
+            for start in range(0, len(invoice_ids), XML_ZIP_BATCH_SIZE):
+                batch = invoice_ids[start:start + XML_ZIP_BATCH_SIZE]
+                for invoice in crud.get_invoices_by_ids(db, batch):
+                    filename = f"E-Invoice_{prefix}-{invoice.invoice_number}.xml"
+                    # Each XML document is serialized directly into its zip entry
+                    with zip_file.open(filename, "w") as entry:
+                        generate_peppol_xml(invoice, invoice.client, settings, out=entry)
+                    yield sink.drain()
+        # Central directory, written when the archive is closed
+        yield sink.drain()
+    finally:
+        db.close()
+
+
 @router.post("/export/xml")
 def export_xml_invoices(
     req: ExportXMLRequest,
     db: Session = Depends(get_db),
+    settings: dict = Depends(get_request_settings),
     user: str = Depends(get_current_user)
 ):
     """Export selected invoices as E-Invoice (PEPPOL XML)."""
-    settings = crud.get_settings(db)
-    from ..e_invoice import generate_peppol_xml
-    import zipfile
-    
-    xml_files = []
-    for inv_id in req.invoice_ids:
-        invoice = crud.get_invoice(db, inv_id)
-        if invoice:
-            client = invoice.client
-            xml_bytes = generate_peppol_xml(invoice, client, settings)
-            prefix = settings.get('invoice_prefix', 'NC')
-            filename = f"E-Invoice_{prefix}-{invoice.invoice_number}.xml"
-            xml_files.append((filename, xml_bytes))
-            
-    if not xml_files:
+    existing = set(db.scalars(
+        select(models.Invoice.id).where(models.Invoice.id.in_(req.invoice_ids))
+    ))
+    invoice_ids = [inv_id for inv_id in req.invoice_ids if inv_id in existing]
+    if not invoice_ids:
         raise HTTPException(status_code=404, detail="No valid invoices found for export")
-        
-    if len(xml_files) == 1:
+
+    prefix = settings.get('invoice_prefix', 'NC')
+
+    if len(invoice_ids) == 1:
+        invoice = crud.get_invoice(db, invoice_ids[0])
+        filename = f"E-Invoice_{prefix}-{invoice.invoice_number}.xml"
         return Response(
-            content=xml_files[0][1],
+            content=generate_peppol_xml(invoice, invoice.client, settings),
             media_type="application/xml",
-            headers={"Content-Disposition": f"attachment; filename={xml_files[0][0]}"}
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
-    
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
-        for filename, data in xml_files:
-            zip_file.writestr(filename, data)
-            
-    return Response(
-        content=zip_buffer.getvalue(),
+
+    return StreamingResponse(
+        _iter_invoices_xml_zip(invoice_ids, settings, prefix),
         media_type="application/zip",
         headers={"Content-Disposition": "attachment; filename=e_invoices.zip"}
     )
 
 
 @router.get("/{invoice_id}/pdf")
-def download_pdf(invoice_id: int, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
+def download_pdf(
+    invoice_id: int,
+    db: Session = Depends(get_db),
+    settings: dict = Depends(get_request_settings),
+    user: str = Depends(get_current_user)
+):
     """Generate and download PDF invoice."""
     invoice = crud.get_invoice(db, invoice_id)
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    settings = crud.get_settings(db)
-    from ..utils import generate_invoice_pdf
     try:
-        pdf_bytes = generate_invoice_pdf(invoice, settings)
+        pdf_bytes = get_invoice_pdf_cached(invoice, settings)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
     
@@ -373,6 +489,7 @@ async def send_invoice_with_email(
     invoice_id: int, 
     email_data: EmailRequest,
     db: Session = Depends(get_db), 
+    settings: dict = Depends(get_request_settings),
     user: str = Depends(get_current_user)
 ):
     """Generate PDF and send via email."""
@@ -380,42 +497,108 @@ async def send_invoice_with_email(
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
 
-    settings = crud.get_settings(db)
-    from ..utils import generate_invoice_pdf, send_invoice_email
-    
     try:
-        pdf_bytes = generate_invoice_pdf(invoice, settings)
+        pdf_bytes = get_invoice_pdf_cached(invoice, settings)
         await send_invoice_email(invoice, settings, pdf_bytes, email_data.to_email)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
         
     return {"message": "Email sent successfully"}
+
+
+def _write_pdf_to_temp_file(pdf_bytes: bytes) -> str:
+    """Write PDF bytes into a temp file and return its path."""
+    import tempfile
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(pdf_bytes)
+    return tmp.name
+
+
+GDRIVE_SYNC_WORKERS = 4
+GDRIVE_UPLOAD_ATTEMPTS = 3
+
+
+def _upload_pdf_file_to_gdrive(pdf_path: str, filename: str, settings: dict, attempts: int = 1) -> Optional[str]:
+    """Stream a temp PDF file to Google Drive, then remove it.
+
+    Transient failures (see GDriveTransientError) are retried up to
+    ``attempts`` times in total, waiting 2 s, 4 s, ... between tries; the last
+    one is re-raised. Permanent failures return None straight away.
+    """
+    try:
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(2 ** attempt)
+            try:
+                return upload_to_gdrive(pdf_path, filename, settings)
+            except GDriveTransientError as e:
+                if attempt == attempts - 1:
+                    raise
+                logging.getLogger(__name__).warning(f"{e}; retrying")
+        return None
+    finally:
+        os.remove(pdf_path)
+
+
+def _upload_invoice_pdf_task(invoice_id: int, settings: dict) -> None:
+    """Background task: render an invoice PDF and upload it to Google Drive.
+
+    Runs after the response is sent, so it loads the invoice with a session of
+    its own.
+    """
+    db = SessionLocal()
+    try:
+        invoice = crud.get_invoice(db, invoice_id)
+        if not invoice:
+            return
+        pdf_path = _write_pdf_to_temp_file(get_invoice_pdf_cached(invoice, settings))
+        _upload_pdf_file_to_gdrive(pdf_path, f"Invoice-{invoice.invoice_number}.pdf", settings)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Google Drive auto-upload failed: {e}")
+    finally:
+        db.close()
+
+
 @router.post("/sync-gdrive")
-def sync_all_to_gdrive(db: Session = Depends(get_db), user: str = Depends(get_current_user)):
+def sync_all_to_gdrive(
+    db: Session = Depends(get_db),
+    settings: dict = Depends(get_request_settings),
+    user: str = Depends(get_current_user)
+):
     """Synchronize all existing invoices to Google Drive."""
-    settings = crud.get_settings(db)
     if settings.get("gdrive_enabled") != "true":
         raise HTTPException(status_code=400, detail="Google Drive is not enabled in settings")
     
     res = crud.get_invoices(db, size=1000) # Get a large batch for sync
     invoices = res["items"]
-    from ..utils import generate_invoice_pdf
-    from ..gdrive import upload_to_gdrive
     
+    # PDFs are rendered on all cores (see generate_invoices_pdf_bulk) and each
+    # one is handed to a small upload pool (network) as soon as it is ready,
+    # so rendering and uploading overlap instead of alternating. The pool stays small
+    # to keep clear of Drive's rate limits.
+    # In a real app we might want to check if a file already exists,
+    # but for now we trust GDrive or just overwrite.
     uploaded_count = 0
-    for invoice in invoices:
-        try:
-            pdf_bytes = generate_invoice_pdf(invoice, settings)
+    with ThreadPoolExecutor(max_workers=GDRIVE_SYNC_WORKERS) as pool:
+        futures = {}
+        for invoice, pdf_bytes in zip(invoices, generate_invoices_pdf_bulk(invoices, settings)):
+            if pdf_bytes is None:
+                continue  # render error already logged
+            try:
+                pdf_path = _write_pdf_to_temp_file(pdf_bytes)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Sync failed for invoice {invoice.invoice_number}: {e}")
+                continue
             filename = f"Invoice-{invoice.invoice_number}.pdf"
-            # In a real app we might want to check if it already exists, 
-            # but for now we trust GDrive or just overwrite.
-            # We don't use a background thread for EACH file to avoid rate limits, 
-            # but we could wrap the whole loop in one.
-            if upload_to_gdrive(pdf_bytes, filename, settings):
-                uploaded_count += 1
-        except Exception as e:
-            import logging
-            logging.getLogger(__name__).error(f"Sync failed for invoice {invoice.invoice_number}: {e}")
-            continue
+            future = pool.submit(_upload_pdf_file_to_gdrive, pdf_path, filename, settings, GDRIVE_UPLOAD_ATTEMPTS)
+            futures[future] = invoice.invoice_number
+
+        for future in as_completed(futures):
+            try:
+                if future.result():
+                    uploaded_count += 1
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Sync failed for invoice {futures[future]}: {e}")
             
     return {"uploaded": uploaded_count}
@@ -1,6 +1,6 @@
 """Service / Product catalog API endpoints."""
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from ..database import get_db
@@ -18,7 +18,11 @@ def list_services(
     db: Session = Depends(get_db), 
     user: str = Depends(get_current_user)
 ):
-    return crud.get_services(db, page=page, size=size, search=search)
+    data = crud.get_services(db, page=page, size=size, search=search)
+    # Validate and serialize here; returning a Response skips FastAPI doing the
+    # same again on an extra threadpool hop
+    page_model = schemas.PaginatedServices.model_validate(data, from_attributes=True)
+    return Response(content=page_model.model_dump_json(), media_type="application/json")
 
 
 @router.get("/{service_id}", response_model=schemas.ServiceRead)
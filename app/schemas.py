@@ -1,18 +1,7 @@
 from pydantic import BaseModel
-from typing import Optional, List, Generic, TypeVar
+from typing import Optional, List
 from datetime import date
 
-T = TypeVar("T")
-
-
-class PaginatedResponse(BaseModel, Generic[T]):
-    """Generic paginated response wrapper."""
-    items: List[T]
-    total: int
-    page: int
-    size: int
-    pages: int
-
 
 # ── Settings ──────────────────────────────────────────────────────────
 
@@ -65,6 +54,10 @@ class UserProfileUpdate(BaseModel):
     password: Optional[str] = None
 
 
+class CurrentUser(BaseModel):
+    username: str
+
+
 # ── Client ────────────────────────────────────────────────────────────
 
 class ClientBase(BaseModel):
@@ -178,13 +171,41 @@ class InvoiceRead(InvoiceBase):
 
     class Config:
         from_attributes = True
+
+
+class NextInvoiceNumber(BaseModel):
+    next_number: str
+
+
 class DashboardStats(BaseModel):
     unpaid_total: float
     monthly_turnover: float
     monthly_data: List[dict]
 
 
-# Convenience type aliases
-PaginatedInvoices = PaginatedResponse[InvoiceRead]
-PaginatedClients = PaginatedResponse[ClientRead]
-PaginatedServices = PaginatedResponse[ServiceRead]
+# ── Paginated responses ───────────────────────────────────────────────
+# Concrete classes rather than a parametrized Generic model, so each gets one
+# static schema built at import time.
+
+class PaginatedInvoices(BaseModel):
+    items: List[InvoiceRead]
+    total: int
+    page: int
+    size: int
+    pages: int
+
+
+class PaginatedClients(BaseModel):
+    items: List[ClientRead]
+    total: int
+    page: int
+    size: int
+    pages: int
+
+
+class PaginatedServices(BaseModel):
+    items: List[ServiceRead]
+    total: int
+    page: int
+    size: int
+    pages: int
@@ -1,38 +1,59 @@
 """Utility helpers – number-to-words (Latvian) and invoice numbering."""
 
+from sqlalchemy import Integer, bindparam, cast, func, select
 from sqlalchemy.orm import Session
-from .models import Invoice
+from .models import Invoice, line_amounts
+from collections import OrderedDict, defaultdict
 from io import BytesIO
+import copy
+import functools
+import hashlib
+import json
+import logging
 import os
 import sys
+import threading
+import time
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
+from pydantic_core import from_json
+from starlette.datastructures import Headers, UploadFile
 import requests
-from typing import Optional
+import requests.adapters
+from typing import BinaryIO, Iterator, Optional
 
 
 
 # ── Latvian number-to-words (grammar-correct) ────────────────────────
 
-_ONES_M = [
+_ONES_M = (
     "", "viens", "divi", "trīs", "četri", "pieci",
     "seši", "septiņi", "astoņi", "deviņi",
-]
+)
 
-_TEENS = [
+_TEENS = (
     "desmit", "vienpadsmit", "divpadsmit", "trīspadsmit", "četrpadsmit",
     "piecpadsmit", "sešpadsmit", "septiņpadsmit", "astoņpadsmit", "deviņpadsmit",
-]
+)
 
-_TENS = [
+_TENS = (
     "", "desmit", "divdesmit", "trīsdesmit", "četrdesmit", "piecdesmit",
     "sešdesmit", "septiņdesmit", "astoņdesmit", "deviņdesmit",
-]
+)
 
+# Hundreds followed by more digits take the locative "simt"; exactly N hundred
+# takes the nominative ("simts" for 100)
+_HUNDREDS = (
+    "", "simt", "divsimt", "trīssimt", "četrsimt", "piecsimt",
+    "sešsimt", "septiņsimt", "astoņsimt", "deviņsimt",
+)
+_HUNDREDS_EXACT = ("", "simts") + _HUNDREDS[2:]
 
-def _hundreds_prefix(h: int) -> str:
-    """Return the Latvian prefix for hundreds (1–9)."""
-    return ["", "simt", "divsimt", "trīssimt", "četrsimt", "piecsimt",
-            "sešsimt", "septiņsimt", "astoņsimt", "deviņsimt"][h]
+# (group size, singular, plural, genitive plural, singular only for exactly one)
+# — largest group first. 21 million is "miljons", but 21 thousand "tūkstoši".
+_SCALES = (
+    (1_000_000, "miljons", "miljoni", "miljonu", False),
+    (1_000, "tūkstotis", "tūkstoši", "tūkstošu", True),
+)
 
 
 def _below_1000(n: int) -> str:
@@ -40,17 +61,8 @@ def _below_1000(n: int) -> str:
     parts: list[str] = []
 
     if n >= 100:
-        h = n // 100
-        remainder = n % 100
-        if remainder == 0:
-            # Exactly N hundred — use nominative "simts"
-            parts.append(["", "simts", "divsimt", "trīssimt", "četrsimt",
-                           "piecsimt", "sešsimt", "septiņsimt", "astoņsimt",
-                           "deviņsimt"][h])
-        else:
-            # N hundred + something — use locative "simt"
-            parts.append(_hundreds_prefix(h))
-        n = remainder
+        h, n = divmod(n, 100)
+        parts.append(_HUNDREDS[h] if n else _HUNDREDS_EXACT[h])
 
     if 10 <= n <= 19:
         parts.append(_TEENS[n - 10])
@@ -64,43 +76,31 @@ def _below_1000(n: int) -> str:
     return " ".join(parts)
 
 
-def _thousands_form(t: int) -> str:
-    """Return grammatically correct Latvian form for thousands multiplier t."""
-    # Numbers 11-19 take genitive plural "tūkstošu"
-    if 11 <= t % 100 <= 19:
-        return f"{_below_1000(t)} tūkstošu"
-    last = t % 10
+def _scale_form(count: int, singular: str, plural: str, genitive: str, exact_one: bool) -> str:
+    """Pick the grammatical form of a scale word for ``count`` of it."""
+    # Numbers 11-19 take genitive plural ("tūkstošu", "miljonu")
+    if 11 <= count % 100 <= 19:
+        return genitive
+    last = count % 10
     if last == 1:
-        return f"{_below_1000(t)} tūkstotis" if t == 1 else f"{_below_1000(t)} tūkstoši"
+        return plural if exact_one and count != 1 else singular
     if 2 <= last <= 9:
-        return f"{_below_1000(t)} tūkstoši"
-    return f"{_below_1000(t)} tūkstošu"
+        return plural
+    return genitive
 
 
+@functools.lru_cache(maxsize=4096)
 def _int_to_words(n: int) -> str:
     """Convert integer 0-999 999 999 to Latvian words (lowercase)."""
     if n == 0:
         return "nulle"
 
     parts: list[str] = []
-
-    if n >= 1_000_000:
-        millions = n // 1_000_000
-        n %= 1_000_000
-        last = millions % 10
-        if 11 <= millions % 100 <= 19:
-            parts.append(f"{_below_1000(millions)} miljonu")
-        elif last == 1:
-            parts.append(f"{_below_1000(millions)} miljons")
-        elif 2 <= last <= 9:
-            parts.append(f"{_below_1000(millions)} miljoni")
-        else:
-            parts.append(f"{_below_1000(millions)} miljonu")
-
-    if n >= 1000:
-        thousands = n // 1000
-        n %= 1000
-        parts.append(_thousands_form(thousands))
+    for size, *forms in _SCALES:
+        if n >= size:
+            count, n = divmod(n, size)
+            parts.append(_below_1000(count))
+            parts.append(_scale_form(count, *forms))
 
     if n > 0:
         parts.append(_below_1000(n))
@@ -134,43 +134,41 @@ def number_to_words_lv(amount: float) -> str:
 
 # ── Invoice number generation ────────────────────────────────────────
 
-from . import models, schemas, crud
+# Highest numeric suffix among one prefix's invoices, computed in SQL: no row is
+# loaded into Python. Non-numeric suffixes CAST to 0 and simply don't win.
+# "PREFIX-" <= number < "PREFIX." ('.' follows '-') selects the same numbers as
+# LIKE 'PREFIX-%', but as a range SQLite can seek in the invoice_number index;
+# its LIKE is case-insensitive and so can't use that (BINARY) index.
+# Built once; the prefix is bound per call.
+_MAX_INVOICE_SUFFIX = (
+    select(func.max(cast(func.substr(Invoice.invoice_number, bindparam("start")), Integer)))
+    .where(Invoice.invoice_number >= bindparam("low"), Invoice.invoice_number < bindparam("high"))
+)
 
-# ... (omitted imports)
 
 def generate_invoice_number(db: Session) -> str:
     """Generate next invoice number in PREFIX-XXXXXX format."""
+    # Imported here: crud imports this module, so a module-level import would
+    # make app.utils unimportable on its own (e.g. in spawned PDF workers)
+    from . import crud
+
     settings = crud.get_settings(db)
     prefix = settings.get("invoice_prefix", "NC")
     if not prefix:
         prefix = "NC"
         
-    # Find last invoice with this prefix
-    last = (
-        db.query(Invoice)
-        .filter(Invoice.invoice_number.like(f"{prefix}-%"))
-        .order_by(Invoice.id.desc())
-        .first()
-    )
-    
-    if last:
-        try:
-            parts = last.invoice_number.split("-")
-            if len(parts) >= 2:
-                num = int(parts[-1]) + 1
-            else:
-                num = 1
-        except (ValueError, IndexError):
-            num = 1
-    else:
-        num = 1
-        
+    last = db.execute(
+        _MAX_INVOICE_SUFFIX, {"start": len(prefix) + 2, "low": f"{prefix}-", "high": f"{prefix}."}
+    ).scalar()
+    num = (last or 0) + 1
+
     return f"{prefix}-{num:06d}"
 
 
 # ── Font Registration (Global) ────────────────────────────────────────
 
-def _find_font(names: list) -> str:
+@functools.lru_cache(maxsize=8)
+def _find_font(names: tuple) -> str:
     """Search for a font file in common Windows locations, including PyInstaller bundle."""
     search_dirs = [
         # PyInstaller bundle directory (_MEIPASS is set when running as frozen EXE)
@@ -198,65 +196,66 @@ def _find_font(names: list) -> str:
 _FONT_NORMAL = 'Helvetica'
 _FONT_BOLD = 'Helvetica-Bold'
 
-try:
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
 
-    arial_path = _find_font(['arial.ttf', 'Arial.ttf'])
-    arial_bold_path = _find_font(['arialbd.ttf', 'Arialbd.ttf', 'ARIALBD.TTF'])
+@functools.lru_cache(maxsize=1)
+def _ensure_fonts() -> None:
+    """Register the Arial TTFs with ReportLab on first use.
 
-    if arial_path:
-        pdfmetrics.registerFont(TTFont('CustomArial', arial_path))
-        _FONT_NORMAL = 'CustomArial'
-    if arial_bold_path:
-        pdfmetrics.registerFont(TTFont('CustomArialBold', arial_bold_path))
-        _FONT_BOLD = 'CustomArialBold'
+    Done lazily so processes (and requests) that never render a PDF skip the
+    font directory search at import time; the cache makes later calls free.
+    """
+    global _FONT_NORMAL, _FONT_BOLD
+    try:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
 
-    print(f"Fonts registered: Arial={'OK ('+arial_path+')' if arial_path else 'MISSING → using Helvetica'}, ArialBold={'OK' if arial_bold_path else 'MISSING → using Helvetica-Bold'}")
-except Exception as e:
-    print(f"Warning: Could not register fonts: {e} — falling back to Helvetica")
+        arial_path = _find_font(('arial.ttf', 'Arial.ttf'))
+        arial_bold_path = _find_font(('arialbd.ttf', 'Arialbd.ttf', 'ARIALBD.TTF'))
 
+        if arial_path:
+            pdfmetrics.registerFont(TTFont('CustomArial', arial_path))
+            _FONT_NORMAL = 'CustomArial'
+        if arial_bold_path:
+            pdfmetrics.registerFont(TTFont('CustomArialBold', arial_bold_path))
+            _FONT_BOLD = 'CustomArialBold'
 
+        print(f"Fonts registered: Arial={'OK ('+arial_path+')' if arial_path else 'MISSING → using Helvetica'}, ArialBold={'OK' if arial_bold_path else 'MISSING → using Helvetica-Bold'}")
+    except Exception as e:
+        print(f"Warning: Could not register fonts: {e} — falling back to Helvetica")
 
-def generate_invoice_pdf(invoice: Invoice, settings: dict) -> bytes:
-    """Generate PDF bytes for a given invoice using ReportLab (native)."""
-    # Import local ReportLab components
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.pagesizes import A4
+
+# Attribute validation on ReportLab graphics objects is a development aid; it
+# is read when reportlab.graphics is first imported, so set it before that.
+# Page content streams stay compressed (ReportLab's default, kept explicit).
+if not os.environ.get("REKINI_DEBUG"):
+    from reportlab import rl_config
+
+    rl_config.shapeChecking = 0
+    rl_config.pageCompression = 1
+
+
+def _init_styles() -> dict:
+    """Build every ParagraphStyle the invoice PDF uses (once, at import)."""
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     from reportlab.lib import colors
-    from reportlab.lib.units import cm
 
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=1.5*cm,
-        leftMargin=1.5*cm,
-        topMargin=1.0*cm,
-        bottomMargin=1.5*cm
-    )
-
-    elements = []
-    
-    # Styles
     styles = getSampleStyleSheet()
     # Define custom styles using our registered font
-    style_normal = ParagraphStyle(
+    normal = ParagraphStyle(
         'CustomNormal',
         parent=styles['Normal'],
         fontName='CustomArial',
         fontSize=10,
         leading=13
     )
-    style_bold = ParagraphStyle(
+    bold = ParagraphStyle(
         'CustomBold',
         parent=styles['Normal'],
         fontName='CustomArialBold',
         fontSize=10,
         leading=13
     )
-    style_title = ParagraphStyle(
+    title = ParagraphStyle(
         'CustomTitle',
         parent=styles['Heading1'],
         fontName='CustomArialBold',
@@ -266,7 +265,7 @@ def generate_invoice_pdf(invoice: Invoice, settings: dict) -> bytes:
         spaceBefore=0,
         spaceAfter=0
     )
-    style_small = ParagraphStyle(
+    small = ParagraphStyle(
         'CustomSmall',
         parent=styles['Normal'],
         fontName='CustomArial',
@@ -274,40 +273,171 @@ def generate_invoice_pdf(invoice: Invoice, settings: dict) -> bytes:
         textColor=colors.HexColor('#6b7280'), # gray-500
         leading=11
     )
-    style_header = ParagraphStyle(
-        'CustomHeader',
-        parent=style_bold,
-        fontSize=10,
-        textColor=colors.white
+    return {
+        "normal": normal,
+        "bold": bold,
+        "title": title,
+        "small": small,
+        "header": ParagraphStyle('CustomHeader', parent=bold, fontSize=10, textColor=colors.white),
+        "inv_title": ParagraphStyle('InvTitle', parent=title, alignment=2), # Right align
+        "inv_num": ParagraphStyle('InvNum', parent=bold, fontSize=11, alignment=2),
+        "inv_date": ParagraphStyle('InvDate', parent=small, alignment=2),
+        "inv_due": ParagraphStyle('InvDue', parent=small, alignment=2),
+        "co_name": ParagraphStyle('CoName', parent=bold, fontSize=14, spaceAfter=4),
+        "box_title": ParagraphStyle('BoxTitle', parent=bold, fontSize=8, textColor=colors.HexColor('#6b7280'), textTransform='uppercase'),
+        "grand_tot": ParagraphStyle('GrandTot', parent=bold, textColor=colors.HexColor('#1d4ed8'), fontSize=11, alignment=2),
+        "disclaimer": ParagraphStyle('Disclaimer', parent=small, alignment=1, fontName='CustomArial', fontStyle='Italic'),
+    }
+
+
+# Paragraph styles shared by every invoice PDF; treat as read-only
+_STYLES = _init_styles()
+
+
+def _init_items_table_style():
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+
+    return TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#1f2937')), # Header bg gray-800
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+        ('ALIGN', (0,0), (-1,-1), 'LEFT'), # Default left
+        ('ALIGN', (0,0), (0,-1), 'CENTER'), # Nr center
+        ('ALIGN', (2,0), (2,-1), 'CENTER'), # Unit center
+        ('ALIGN', (5,0), (5,-1), 'CENTER'), # VAT center
+        ('ALIGN', (3,0), (4,-1), 'RIGHT'), # Qty, Price right
+        ('ALIGN', (6,0), (6,-1), 'RIGHT'), # Total right
+        ('FONTNAME', (0,0), (-1,-1), 'CustomArial'),
+        ('FONTNAME', (0,0), (-1,0), 'CustomArialBold'), # Header bold
+        ('BOTTOMPADDING', (0,0), (-1,-1), 3),
+        ('TOPPADDING', (0,0), (-1,-1), 3),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor('#e5e7eb')), # Grid lines
+    ])
+
+
+# Items table styling is the same for every invoice; treat as read-only
+_ITEMS_TABLE_STYLE = _init_items_table_style()
+
+
+def _init_party_box_style():
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+
+    return TableStyle([
+        ('BACKGROUND', (0,0), (-1,-1), colors.HexColor('#f9fafb')), # gray-50
+        ('BOX', (0,0), (-1,-1), 0.5, colors.HexColor('#e5e7eb')), # gray-200
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ('LEFTPADDING', (0,0), (-1,-1), 8),
+        ('RIGHTPADDING', (0,0), (-1,-1), 8),
+        ('TOPPADDING', (0,0), (-1,-1), 5),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 5),
+    ])
+
+
+# Supplier / client box styling, shared by both boxes on every invoice
+_PARTY_BOX_STYLE = _init_party_box_style()
+
+
+@functools.lru_cache(maxsize=1)
+def _items_header_row() -> tuple:
+    """Items table header cells, parsed once (needs the fonts registered)."""
+    from reportlab.platypus import Paragraph
+
+    style_header = _STYLES["header"]
+    return tuple(
+        Paragraph(f"<b>{label}</b>", style_header)
+        for label in ("Nr", "Nosaukums", "Mērv.", "Skaits", "Cena", "PVN", "Summa")
     )
 
+
+@functools.lru_cache(maxsize=8)
+def _logo_flowable(logo_base64: str):
+    """Decode the settings logo into an Image flowable, once per distinct logo."""
+    import base64
+    from reportlab.platypus import Image
+    from reportlab.lib.units import cm
+
+    logo_data = logo_base64
+    if ',' in logo_data:
+        logo_data = logo_data.split(',')[1]
+    img_io = BytesIO(base64.b64decode(logo_data))
+    return Image(img_io, width=2.5*cm, height=2.5*cm, kind='proportional')
+
+
+def _warn_if_not_eager_loaded(invoice: Invoice) -> None:
+    # Loaded relationships sit in the instance __dict__; checking that is
+    # cheaper than building inspect(invoice).unloaded
+    unloaded = [name for name in ("client", "items") if name not in invoice.__dict__]
+    if unloaded:
+        logging.getLogger(__name__).warning(
+            f"Invoice {invoice.id} rendered without eager-loaded {', '.join(unloaded)}"
+        )
+
+
+def generate_invoice_pdf(invoice: Invoice, settings: dict, out: Optional[BinaryIO] = None) -> Optional[bytes]:
+    """Generate PDF bytes for a given invoice using ReportLab (native).
+
+    When ``out`` is given the PDF is written into that binary stream
+    and None is returned instead of the bytes.
+
+    ``invoice`` should come with its client and items already loaded
+    (crud.get_invoice / crud.get_invoices do this); otherwise every attribute
+    access below may lazy-load from the database.
+    """
+    _warn_if_not_eager_loaded(invoice)
+    return _render_invoice_pdf(invoice, settings, out)
+
+
+def _render_invoice_pdf(invoice: Invoice, settings: dict, out: Optional[BinaryIO] = None) -> Optional[bytes]:
+    """generate_invoice_pdf without the eager-loading check (done by the caller)."""
+    _ensure_fonts()
+
+    # Import local ReportLab components
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.lib.units import cm
+
+    buffer = out if out is not None else BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=1.5*cm,
+        leftMargin=1.5*cm,
+        topMargin=1.0*cm,
+        bottomMargin=1.5*cm
+    )
+
+    elements = []
+    
+    style_normal = _STYLES["normal"]
+    style_bold = _STYLES["bold"]
+
+    # Settings read more than once below
+    company_name = settings.get('company_name', '')
+    logo_base64 = settings.get('logo_base64')
+
     # 1. Header (Logo / Company Info | Invoice Info)
     logo_img = None
-    if settings.get('logo_base64'):
+    if logo_base64:
         try:
-            import base64
-            from reportlab.platypus import Image
-            logo_data = settings['logo_base64']
-            if ',' in logo_data:
-                logo_data = logo_data.split(',')[1]
-            img_data = base64.b64decode(logo_data)
-            img_io = BytesIO(img_data)
-            logo_img = Image(img_io, width=2.5*cm, height=2.5*cm, kind='proportional')
+            # Copy: drawing sets per-build state on the flowable
+            logo_img = copy.copy(_logo_flowable(logo_base64))
         except Exception as e:
             print(f"Error processing logo for PDF: {e}")
 
     # Right: Invoice Details
     inv_info = [
-        [Paragraph("RĒĶINS", ParagraphStyle('InvTitle', parent=style_title, alignment=2))], # Right align
-        [Paragraph(invoice.invoice_number, ParagraphStyle('InvNum', parent=style_bold, fontSize=11, alignment=2))],
-        [Paragraph(f"Datums: <b>{invoice.date.strftime('%d.%m.%Y')}</b>", ParagraphStyle('InvDate', parent=style_small, alignment=2))],
-        [Paragraph(f"Apmaksas termiņš: <b>{invoice.due_date.strftime('%d.%m.%Y')}</b>", ParagraphStyle('InvDue', parent=style_small, alignment=2))],
+        [Paragraph("RĒĶINS", _STYLES["inv_title"])],
+        [Paragraph(invoice.invoice_number, _STYLES["inv_num"])],
+        [Paragraph(f"Datums: <b>{invoice.date.strftime('%d.%m.%Y')}</b>", _STYLES["inv_date"])],
+        [Paragraph(f"Apmaksas termiņš: <b>{invoice.due_date.strftime('%d.%m.%Y')}</b>", _STYLES["inv_due"])],
     ]
 
     # Left: Settings
     if logo_img:
         company_info = [
-            [logo_img, Paragraph(settings.get('company_name', ''), ParagraphStyle('CoName', parent=style_bold, fontSize=14, spaceAfter=4))],
+            [logo_img, Paragraph(company_name, _STYLES["co_name"])],
         ]
         # Adjust column widths if logo exists
         header_table = Table([
@@ -316,7 +446,7 @@ def generate_invoice_pdf(invoice: Invoice, settings: dict) -> bytes:
         ], colWidths=[11*cm, 7*cm])
     else:
         company_info = [
-            [Paragraph(settings.get('company_name', ''), ParagraphStyle('CoName', parent=style_bold, fontSize=14, spaceAfter=4))],
+            [Paragraph(company_name, _STYLES["co_name"])],
         ]
         header_table = Table([
             [Table(company_info, colWidths=[11*cm], style=[('VALIGN',(0,0),(-1,-1),'TOP'),('LEFTPADDING',(0,0),(-1,-1),0)]), 
@@ -337,34 +467,30 @@ def generate_invoice_pdf(invoice: Invoice, settings: dict) -> bytes:
     # 2. Parties (Supplier | Client)
     
     def create_party_box(title, name, reg_no, vat_no, address, bank_name, bank_swift, bank_acc, phone, email):
-        content = [
-            [Paragraph(title, ParagraphStyle('BoxTitle', parent=style_bold, fontSize=8, textColor=colors.HexColor('#6b7280'), textTransform='uppercase'))],
-            [Paragraph(name if name else "", style_bold)],
-            [Paragraph(f"Reģ. Nr.: {reg_no}" if reg_no else "", style_normal)],
+        # (label, value, keep the row even when empty, style); the name,
+        # reg. no. and address rows always take their line in the box
+        fields = (
+            ("", name, True, style_bold),
+            ("Reģ. Nr.: ", reg_no, True, style_normal),
+            ("PVN Nr.: ", vat_no, False, style_normal),
+            ("Adrese: ", address, True, style_normal),
+            ("Banka: ", bank_name, False, style_normal),
+            ("SWIFT: ", bank_swift, False, style_normal),
+            ("Konts: ", bank_acc, False, style_normal),
+            ("Tālr.: ", phone, False, style_normal),
+            ("E-pasts: ", email, False, style_normal),
+        )
+        content = [[Paragraph(title, _STYLES["box_title"])]]
+        content += [
+            [Paragraph(f"{label}{value}" if value else "", style)]
+            for label, value, always, style in fields
+            if value or always
         ]
-        if vat_no: content.append([Paragraph(f"PVN Nr.: {vat_no}", style_normal)])
-        content.append([Paragraph(f"Adrese: {address}" if address else "", style_normal)])
-        if bank_name: content.append([Paragraph(f"Banka: {bank_name}", style_normal)])
-        if bank_swift: content.append([Paragraph(f"SWIFT: {bank_swift}", style_normal)])
-        if bank_acc: content.append([Paragraph(f"Konts: {bank_acc}", style_normal)])
-        if phone: content.append([Paragraph(f"Tālr.: {phone}", style_normal)])
-        if email: content.append([Paragraph(f"E-pasts: {email}", style_normal)])
-        
-        t = Table(content, colWidths=[8.5*cm])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,-1), colors.HexColor('#f9fafb')), # gray-50
-            ('BOX', (0,0), (-1,-1), 0.5, colors.HexColor('#e5e7eb')), # gray-200
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('LEFTPADDING', (0,0), (-1,-1), 8),
-            ('RIGHTPADDING', (0,0), (-1,-1), 8),
-            ('TOPPADDING', (0,0), (-1,-1), 5),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 5),
-        ]))
-        return t
+        return Table(content, colWidths=[8.5*cm], style=_PARTY_BOX_STYLE)
 
     supplier_box = create_party_box(
         "PAKALPOJUMU SNIEDZĒJS",
-        settings.get('company_name', ''),
+        company_name,
         settings.get('reg_number', ''),
         settings.get('vat_number', ''),
         settings.get('legal_address', ''),
@@ -397,64 +523,53 @@ def generate_invoice_pdf(invoice: Invoice, settings: dict) -> bytes:
     # (Banks block removed as it is now integrated into party boxes)
 
     # 4. Items Table
-    data = [[
-        Paragraph("<b>Nr</b>", style_header),
-        Paragraph("<b>Nosaukums</b>", style_header),
-        Paragraph("<b>Mērv.</b>", style_header),
-        Paragraph("<b>Skaits</b>", style_header),
-        Paragraph("<b>Cena</b>", style_header),
-        Paragraph("<b>PVN</b>", style_header),
-        Paragraph("<b>Summa</b>", style_header)
-    ]]
+    # Shallow copies share the parsed header text but not per-build layout state
+    data = [[copy.copy(cell) for cell in _items_header_row()]]
     
+    # VAT breakdown is collected in the same pass over the lines
+    # Only the description needs paragraph wrapping; numeric cells stay plain
+    # strings, which Table draws directly without building a flowable.
+    # Line and invoice totals are summed here in the same pass (line_amounts, as
+    # in Invoice.compute_totals) instead of going through the item/invoice
+    # properties, each of which walks all lines again.
+    vat_groups = defaultdict(float)
+    subtotal = vat_total = 0.0
+    add_row = data.append
     for i, item in enumerate(invoice.items, 1):
-        data.append([
+        quantity, unit_price, vat_rate = item.quantity, item.unit_price, item.vat_rate
+        line_total, line_vat = line_amounts(quantity, unit_price, vat_rate)
+        subtotal += line_total
+        vat_total += line_vat
+        vat_groups[vat_rate] += line_vat
+        add_row((
             str(i),
             Paragraph(item.description, style_normal),
             item.unit,
-            f"{item.quantity:.2f}",
-            f"{item.unit_price:.2f}",
-            f"{item.vat_rate}%",
-            f"{item.total:.2f}"
-        ])
+            f"{quantity:.2f}",
+            f"{unit_price:.2f}",
+            f"{vat_rate}%",
+            f"{line_total:.2f}",
+        ))
+    subtotal = round(subtotal, 2)
+    grand_total = round(subtotal + round(vat_total, 2), 2)
 
     items_table = Table(data, colWidths=[1*cm, 6.5*cm, 1.5*cm, 2*cm, 2*cm, 2*cm, 3*cm])
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#1f2937')), # Header bg gray-800
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-        ('ALIGN', (0,0), (-1,-1), 'LEFT'), # Default left
-        ('ALIGN', (0,0), (0,-1), 'CENTER'), # Nr center
-        ('ALIGN', (2,0), (2,-1), 'CENTER'), # Unit center
-        ('ALIGN', (5,0), (5,-1), 'CENTER'), # VAT center
-        ('ALIGN', (3,0), (4,-1), 'RIGHT'), # Qty, Price right
-        ('ALIGN', (6,0), (6,-1), 'RIGHT'), # Total right
-        ('FONTNAME', (0,0), (-1,-1), 'CustomArial'),
-        ('FONTNAME', (0,0), (-1,0), 'CustomArialBold'), # Header bold
-        ('BOTTOMPADDING', (0,0), (-1,-1), 3),
-        ('TOPPADDING', (0,0), (-1,-1), 3),
-        ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor('#e5e7eb')), # Grid lines
-    ]))
+    items_table.setStyle(_ITEMS_TABLE_STYLE)
     elements.append(items_table)
     elements.append(Spacer(1, 0.3*cm))
 
     # 5. Totals
     totals_data = [
-        ["Kopā (EUR):", f"{invoice.subtotal:.2f}"],
+        ["Kopā (EUR):", f"{subtotal:.2f}"],
     ]
     
-    # Calculate VAT breakdown
-    vat_groups = {}
-    for item in invoice.items:
-        rate = item.vat_rate
-        vat_groups[rate] = vat_groups.get(rate, 0) + item.vat_amount
+    for rate, vat_sum in sorted(vat_groups.items()):
+        totals_data.append([f"PVN {int(rate)}% (EUR):", f"{vat_sum:.2f}"])
         
-    for rate in sorted(vat_groups.keys()):
-        totals_data.append([f"PVN {int(rate)}% (EUR):", f"{vat_groups[rate]:.2f}"])
-        
-    totals_data.append(["Summa ar PVN (EUR):", f"{invoice.grand_total:.2f}"])
+    totals_data.append(["Summa ar PVN (EUR):", f"{grand_total:.2f}"])
     totals_data.append([
         Paragraph("<b>Kopā apmaksai (EUR):</b>", style_normal), 
-        Paragraph(f"<b>{invoice.grand_total:.2f}</b>", ParagraphStyle('GrandTot', parent=style_bold, textColor=colors.HexColor('#1d4ed8'), fontSize=11, alignment=2))
+        Paragraph(f"<b>{grand_total:.2f}</b>", _STYLES["grand_tot"])
     ])
     
     totals_table = Table(totals_data, colWidths=[13*cm, 5*cm])
@@ -468,7 +583,7 @@ def generate_invoice_pdf(invoice: Invoice, settings: dict) -> bytes:
     elements.append(Spacer(1, 0.4*cm))
 
     # 6. Sum Words
-    total_in_words = number_to_words_lv(invoice.grand_total)
+    total_in_words = number_to_words_lv(grand_total)
     sum_words_box = Table([[
         Paragraph(f"<b>SUMMA VĀRDIEM:</b> {total_in_words}.", style_normal)
     ]], colWidths=[18*cm])
@@ -493,77 +608,241 @@ def generate_invoice_pdf(invoice: Invoice, settings: dict) -> bytes:
         elements.append(Paragraph(invoice.issuer_name, style_normal))
 
     elements.append(Spacer(1, 0.5*cm))
-    elements.append(Paragraph("Rēķins sagatavots elektroniski un ir derīgs bez paraksta", ParagraphStyle('Disclaimer', parent=style_small, alignment=1, fontName='CustomArial', fontStyle='Italic')))
+    elements.append(Paragraph("Rēķins sagatavots elektroniski un ir derīgs bez paraksta", _STYLES["disclaimer"]))
 
     # Build
     doc.build(elements)
+    if out is not None:
+        return None
     pdf_bytes = buffer.getvalue()
     buffer.close()
     
     return pdf_bytes
 
 
-async def send_invoice_email(invoice: Invoice, settings: dict, pdf_bytes: bytes, to_email: str):
-    """Send invoice via email using SMTP settings."""
-    username = settings.get("smtp_username", "")
-    password = settings.get("smtp_password", "")
-    
-    conf = ConnectionConfig(
-        MAIL_USERNAME = username,
-        MAIL_PASSWORD = password,
-        MAIL_FROM = settings.get("smtp_from_email") or (username if "@" in username else None) or "noreply@example.com",
-        MAIL_PORT = int(settings.get("smtp_port") or 587),
-        MAIL_SERVER = settings.get("smtp_server") or "smtp.gmail.com",
-        MAIL_STARTTLS = bool(settings.get("smtp_tls", "true") == "true"),
-        MAIL_SSL_TLS = False,
-        USE_CREDENTIALS = bool(username and password),
-        VALIDATE_CERTS = True
+# Rendered PDFs: content key -> PDF bytes, least recently used first.
+# The key is built from everything the PDF shows (invoice, client, lines and
+# the settings in PDF_SETTINGS_KEYS), so an edit anywhere simply misses the
+# cache — nothing to invalidate.
+PDF_CACHE_MAX_ENTRIES = 256
+_pdf_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+_pdf_cache_lock = threading.Lock()
+
+# The settings generate_invoice_pdf reads; changing any other setting (SMTP,
+# Google Drive, ...) keeps the cached PDFs
+PDF_SETTINGS_KEYS = (
+    "company_name", "logo_base64", "reg_number", "vat_number", "legal_address",
+    "bank1_name", "bank1_swift", "bank1_account", "phone", "email",
+)
+_pdf_settings_digest_cache: tuple = ((), b"")  # (raw values, digest)
+
+
+def _row_values(obj) -> tuple:
+    return tuple(getattr(obj, column.key) for column in obj.__table__.columns)
+
+
+def _pdf_settings_digest(settings: dict) -> bytes:
+    """Digest of the PDF-relevant settings; rehashed only when one of them changes."""
+    global _pdf_settings_digest_cache
+    raw = tuple(settings.get(key) for key in PDF_SETTINGS_KEYS)
+    cached_raw, digest = _pdf_settings_digest_cache
+    if raw != cached_raw:
+        digest = hashlib.blake2b(json.dumps(raw).encode(), digest_size=16).digest()
+        _pdf_settings_digest_cache = (raw, digest)
+    return digest
+
+
+def _pdf_cache_key(invoice: Invoice, settings_digest: bytes) -> tuple:
+    return (
+        _row_values(invoice),
+        _row_values(invoice.client) if invoice.client else None,
+        tuple(_row_values(item) for item in invoice.items),
+        settings_digest,
     )
 
-    import tempfile
-    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-        tmp.write(pdf_bytes)
-        tmp_path = tmp.name
 
-    try:
-        message = MessageSchema(
-            subject=f"Rēķins {invoice.invoice_number}",
-            recipients=[to_email],
-            body=f"Labdien,\n\nNosūtām rēķinu Nr. {invoice.invoice_number} apmaksai.\n\nAr cieņu,\n{settings.get('company_name', '')}",
-            subtype=MessageType.plain,
-            attachments=[tmp_path]
-        )
+def _pdf_cache_get(key: tuple) -> Optional[bytes]:
+    with _pdf_cache_lock:
+        pdf_bytes = _pdf_cache.get(key)
+        if pdf_bytes is not None:
+            _pdf_cache.move_to_end(key)
+        return pdf_bytes
 
-        fm = FastMail(conf)
-        await fm.send_message(message)
-    finally:
-        # Cleanup temp file
-        if os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except Exception:
-                pass
 
+def _pdf_cache_put(key: tuple, pdf_bytes: bytes) -> None:
+    with _pdf_cache_lock:
+        _pdf_cache[key] = pdf_bytes
+        if len(_pdf_cache) > PDF_CACHE_MAX_ENTRIES:
+            _pdf_cache.popitem(last=False)
 
-async def send_test_email(settings: dict, to_email: str):
-    """Send a test email to verify SMTP settings."""
-    username = settings.get("smtp_username", "")
-    password = settings.get("smtp_password", "")
-    try:
+
+def get_invoice_pdf_cached(invoice: Invoice, settings: dict) -> bytes:
+    """Return the invoice PDF, reusing an earlier render of identical content."""
+    _warn_if_not_eager_loaded(invoice)
+    key = _pdf_cache_key(invoice, _pdf_settings_digest(settings))
+    pdf_bytes = _pdf_cache_get(key)
+    if pdf_bytes is None:
+        pdf_bytes = _render_invoice_pdf(invoice, settings)
+        _pdf_cache_put(key, pdf_bytes)
+    return pdf_bytes
+
+
+# Below this many PDFs to render, starting worker processes costs more than it saves
+PDF_BULK_MIN_BATCH = 8
+
+
+def _invoice_from_cache_key(key: tuple) -> Invoice:
+    """Rebuild a detached Invoice (with client and items) from its PDF cache key.
+
+    The cache key already holds every column the PDF shows, as plain picklable
+    values, so it doubles as the payload sent to worker processes.
+    """
+    from .models import Client, InvoiceItem
+
+    def columns(model, values):
+        return dict(zip((column.key for column in model.__table__.columns), values))
+
+    invoice_values, client_values, item_values, _ = key
+    invoice = Invoice(**columns(Invoice, invoice_values))
+    invoice.client = Client(**columns(Client, client_values)) if client_values else None
+    invoice.items = [InvoiceItem(**columns(InvoiceItem, values)) for values in item_values]
+    return invoice
+
+
+# PDF settings of a worker process, set once by _init_pdf_worker
+_worker_pdf_settings: dict = {}
+
+
+def _init_pdf_worker(pdf_settings: dict) -> None:
+    """Worker-process initializer: register fonts and keep the PDF settings.
+
+    The settings (logo included) then cross the process boundary once per
+    worker instead of once per invoice.
+    """
+    global _worker_pdf_settings
+    _worker_pdf_settings = pdf_settings
+    _ensure_fonts()
+
+
+def _render_pdf_from_cache_key(key: tuple) -> bytes:
+    """Worker-process entry point for generate_invoices_pdf_bulk."""
+    return _render_invoice_pdf(_invoice_from_cache_key(key), _worker_pdf_settings)
+
+
+def generate_invoices_pdf_bulk(invoices: list, settings: dict, workers: Optional[int] = None, mp_context=None) -> Iterator[Optional[bytes]]:
+    """Yield the PDF of each invoice, in order, rendering cache misses in parallel.
+
+    ReportLab is pure Python and holds the GIL, so large batches are rendered
+    in a process pool (one worker per core by default); small batches are
+    rendered inline. A PDF that fails to render is logged and yielded as None.
+    ``mp_context`` overrides the multiprocessing start method (Windows always
+    uses spawn, so workers must be able to import this module on their own).
+    """
+    if invoices:
+        # A batch comes from one query, so its first invoice speaks for the rest
+        _warn_if_not_eager_loaded(invoices[0])
+    settings_digest = _pdf_settings_digest(settings)
+    keys = [_pdf_cache_key(invoice, settings_digest) for invoice in invoices]
+    cached = [_pdf_cache_get(key) for key in keys]
+    misses = [i for i, pdf_bytes in enumerate(cached) if pdf_bytes is None]
+
+    if len(misses) < PDF_BULK_MIN_BATCH:
+        for invoice, key, pdf_bytes in zip(invoices, keys, cached):
+            if pdf_bytes is None:
+                try:
+                    pdf_bytes = _render_invoice_pdf(invoice, settings)
+                    _pdf_cache_put(key, pdf_bytes)
+                except Exception as e:
+                    print(f"Error rendering PDF for invoice {invoice.invoice_number}: {e}")
+            yield pdf_bytes
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Only the settings the PDF reads: no credentials are sent to the workers
+    pdf_settings = {key: settings[key] for key in PDF_SETTINGS_KEYS if key in settings}
+    max_workers = workers or min(os.cpu_count() or 1, len(misses))
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=mp_context,
+        initializer=_init_pdf_worker,
+        initargs=(pdf_settings,),
+    ) as pool:
+        futures = {i: pool.submit(_render_pdf_from_cache_key, keys[i]) for i in misses}
+        for i, pdf_bytes in enumerate(cached):
+            if pdf_bytes is None:
+                try:
+                    pdf_bytes = futures[i].result()
+                    _pdf_cache_put(keys[i], pdf_bytes)
+                except Exception as e:
+                    print(f"Error rendering PDF for invoice {invoices[i].invoice_number}: {e}")
+            yield pdf_bytes
+
+
+# SMTP settings keys with their defaults, in ConnectionConfig argument order
+_SMTP_SETTINGS = (
+    ("smtp_username", ""),
+    ("smtp_password", ""),
+    ("smtp_from_email", None),
+    ("smtp_port", None),
+    ("smtp_server", None),
+    ("smtp_tls", "true"),
+)
+_mail_conf_cache: tuple = ((), None)  # (raw values, ConnectionConfig)
+
+
+def _mail_config(settings: dict) -> ConnectionConfig:
+    """Return the SMTP ConnectionConfig for ``settings``.
+
+    ConnectionConfig is a pydantic BaseSettings (validation plus an environment
+    scan on every construction), so it is only rebuilt when an SMTP value changes.
+    """
+    global _mail_conf_cache
+    raw = tuple(settings.get(key, default) for key, default in _SMTP_SETTINGS)
+    cached_raw, conf = _mail_conf_cache
+    if raw != cached_raw:
+        username, password, from_email, port, server, tls = raw
         conf = ConnectionConfig(
-            MAIL_USERNAME=username,
-            MAIL_PASSWORD=password,
-            MAIL_FROM = settings.get("smtp_from_email") or (username if "@" in username else None) or "noreply@example.com",
-            MAIL_PORT = int(settings.get("smtp_port") or 587),
-            MAIL_SERVER = settings.get("smtp_server") or "smtp.gmail.com",
-            MAIL_STARTTLS=bool(settings.get("smtp_tls", "true") == "true"),
-            MAIL_SSL_TLS=False,
+            MAIL_USERNAME = username,
+            MAIL_PASSWORD = password,
+            MAIL_FROM = from_email or (username if "@" in username else None) or "noreply@example.com",
+            MAIL_PORT = int(port or 587),
+            MAIL_SERVER = server or "smtp.gmail.com",
+            MAIL_STARTTLS = bool(tls == "true"),
+            MAIL_SSL_TLS = False,
             USE_CREDENTIALS = bool(username and password),
-            VALIDATE_CERTS=True
+            VALIDATE_CERTS = True
         )
-    except Exception as e:
-        pass  # Log silently
-        raise e
+        _mail_conf_cache = (raw, conf)
+    return conf
+
+
+async def send_invoice_email(invoice: Invoice, settings: dict, pdf_bytes: bytes, to_email: str):
+    """Send invoice via email using SMTP settings."""
+    conf = _mail_config(settings)
+
+    # Attach the PDF from memory: BytesIO shares the bytes object's buffer, so
+    # there is no temp file to write, re-read and delete
+    attachment = UploadFile(
+        file=BytesIO(pdf_bytes),
+        filename=f"Invoice-{invoice.invoice_number}.pdf",
+        headers=Headers({"content-type": "application/pdf"}),
+    )
+    message = MessageSchema(
+        subject=f"Rēķins {invoice.invoice_number}",
+        recipients=[to_email],
+        body=f"Labdien,\n\nNosūtām rēķinu Nr. {invoice.invoice_number} apmaksai.\n\nAr cieņu,\n{settings.get('company_name', '')}",
+        subtype=MessageType.plain,
+        attachments=[attachment]
+    )
+
+    fm = FastMail(conf)
+    await fm.send_message(message)
+
+
+async def send_test_email(settings: dict, to_email: str):
+    """Send a test email to verify SMTP settings."""
+    conf = _mail_config(settings)
     message = MessageSchema(
         subject="Invoice Manager — SMTP testa e-pasts",
         recipients=[to_email],
@@ -574,10 +853,55 @@ async def send_test_email(settings: dict, to_email: str):
     await fm.send_message(message)
 
 
+# ── Latvian Open Data (Enterprise Register) lookups ─────────────────
+
+OPEN_DATA_URL = "https://data.gov.lv/dati/lv/api/3/action/datastore_search"
+# (connect, read) seconds: a dead host fails fast, a slow search may still finish
+OPEN_DATA_TIMEOUT = (2, 4)
+OPEN_DATA_CACHE_TTL_SECONDS = 3600  # the register dataset changes at most daily
+OPEN_DATA_CACHE_MAX_SIZE = 1024
+
+# One shared session so lookups while typing reuse the TCP/TLS connection
+_open_data_session = requests.Session()
+_open_data_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=10))
+
+# Successful lookups: (kind, normalized query) -> (result, expiry as epoch seconds)
+_open_data_cache: dict = {}
+_open_data_cache_lock = threading.Lock()
+
+
+def _open_data_cached(key: tuple):
+    """Return a fresh cached lookup result, or None."""
+    with _open_data_cache_lock:
+        entry = _open_data_cache.get(key)
+        if entry is None:
+            return None
+        result, expires_at = entry
+        if expires_at <= time.time():
+            del _open_data_cache[key]
+            return None
+        return result
+
+
+def _open_data_store(key: tuple, result) -> None:
+    with _open_data_cache_lock:
+        if len(_open_data_cache) >= OPEN_DATA_CACHE_MAX_SIZE:
+            # Drop the oldest entry (dicts keep insertion order)
+            _open_data_cache.pop(next(iter(_open_data_cache)))
+        _open_data_cache[key] = (result, time.time() + OPEN_DATA_CACHE_TTL_SECONDS)
+
+
+# str.translate table that deletes every non-digit in the Latin-1 range
+_NON_DIGITS = str.maketrans("", "", "".join(chr(c) for c in range(256) if not chr(c).isdigit()))
+
+
 def fetch_company_data(reg_number: str) -> Optional[dict]:
     """Fetch company data from Latvian Open Data API (Enterprise Register)."""
     # Sanitize input: remove spaces and non-digits
-    reg_clean = "".join(filter(str.isdigit, reg_number))
+    reg_clean = reg_number.translate(_NON_DIGITS)
+    if not reg_clean.isdigit():
+        # Rare: characters beyond Latin-1 that the table does not cover
+        reg_clean = "".join(filter(str.isdigit, reg_clean))
     
     if not reg_clean:
         return None
@@ -587,7 +911,12 @@ def fetch_company_data(reg_number: str) -> Optional[dict]:
     except ValueError:
         return None
 
-    endpoint = "https://data.gov.lv/dati/lv/api/3/action/datastore_search"
+    cache_key = ("company", reg_int)
+    cached = _open_data_cached(cache_key)
+    if cached is not None:
+        return dict(cached)
+
+    endpoint = OPEN_DATA_URL
     resource_id = "25e80bf3-f107-4ab4-89ef-251b5b9374e9"
     
     # Filter by integer regcode
@@ -597,11 +926,11 @@ def fetch_company_data(reg_number: str) -> Optional[dict]:
     }
     
     try:
-        response = requests.get(endpoint, params=params, timeout=5)
+        response = _open_data_session.get(endpoint, params=params, timeout=OPEN_DATA_TIMEOUT)
 #         print(f"DEBUG URL: {response.url}")
 #         print(f"DEBUG RESP: {response.text}") 
         response.raise_for_status()
-        data = response.json()
+        data = from_json(response.content)
         
         if data.get("success") and data.get("result", {}).get("records"):
             # Return the first match
@@ -610,13 +939,15 @@ def fetch_company_data(reg_number: str) -> Optional[dict]:
             # Construct VAT number (assumption: LV + regcode)
             vat_number = f"LV{reg_clean}"
             
-            return {
+            company = {
                 "name": record.get("name"),
                 "reg_number": str(record.get("regcode")),
                 "vat_number": vat_number,
                 "legal_address": record.get("address"),
                 "registration_date": record.get("registered")
             }
+            _open_data_store(cache_key, company)
+            return dict(company)
             
     except Exception as e:
         print(f"Error fetching company data: {e}")
@@ -630,7 +961,13 @@ def search_companies(q: str):
     if not q or len(q) < 2:
         return []
 
-    endpoint = "https://data.gov.lv/dati/lv/api/3/action/datastore_search"
+    # The register's full-text search ignores case and surrounding spaces
+    cache_key = ("search", q.strip().lower())
+    cached = _open_data_cached(cache_key)
+    if cached is not None:
+        return [dict(r) for r in cached]
+
+    endpoint = OPEN_DATA_URL
     # Resource ID for "Uzņēmumu reģistra dati"
     resource_id = "25e80bf3-f107-4ab4-89ef-251b5b9374e9"
     
@@ -641,9 +978,9 @@ def search_companies(q: str):
     }
     
     try:
-        response = requests.get(endpoint, params=params, timeout=5)
+        response = _open_data_session.get(endpoint, params=params, timeout=OPEN_DATA_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        data = from_json(response.content)
         
         results = []
         if data.get("success") and data.get("result", {}).get("records"):
@@ -666,7 +1003,8 @@ def search_companies(q: str):
                     "postal_code": postal_code,
                     "registration_date": record.get("registered")
                 })
-        return results
+        _open_data_store(cache_key, results)
+        return [dict(r) for r in results]
             
     except Exception as e:
         print(f"Error searching companies: {e}")
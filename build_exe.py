@@ -25,6 +25,12 @@ def build():
     static_dir = os.path.join(app_dir, 'static')
     templates_dir = os.path.join(app_dir, 'templates')
 
+    # Drive API discovery document shipped with googleapiclient — gdrive.py builds the
+    # service with static_discovery=True, so only this one of its ~600 bundled docs is needed
+    import googleapiclient
+    discovery_docs_dir = os.path.join(os.path.dirname(googleapiclient.__file__), 'discovery_cache', 'documents')
+    drive_discovery_doc = os.path.join(discovery_docs_dir, 'drive.v3.json')
+
     cmd = [
         sys.executable, '-m', 'PyInstaller',
         '--noconfirm',
@@ -40,6 +46,8 @@ def build():
         # Bundle data files
         f'--add-data={static_dir};app/static',
         f'--add-data={templates_dir};app/templates',
+        f'--add-data={drive_discovery_doc};googleapiclient/discovery_cache/documents',
+        f'--add-data={os.path.join(project_dir, "tray_icon.png")};.',
 
         # Hidden imports that PyInstaller may miss
         '--hidden-import=webview',
@@ -73,6 +81,7 @@ def build():
         '--hidden-import=PIL',
         '--hidden-import=PIL.Image',
         '--hidden-import=PIL.ImageDraw',
+        '--hidden-import=PIL.PngImagePlugin',
         '--hidden-import=email.mime.multipart',
         '--hidden-import=email.mime.text',
         '--hidden-import=email.mime.base',
@@ -3,7 +3,11 @@ Invoice Manager — Windows Desktop Launcher
 Starts the FastAPI server, opens the browser, and provides a system tray icon.
 """
 
+import asyncio
+import errno
+import functools
 import os
+import select
 import sys
 import time
 import socket
@@ -30,6 +34,82 @@ def _acquire_mutex() -> bool:
     return True
 
 
+# A second launch signals this event instead of opening its own browser window;
+# the running instance then brings up an app window on its actual port.
+_WAKE_EVENT_NAME = "InvoiceManagerWake_DEV_8001"
+_wake_event = None
+_EVENT_MODIFY_STATE = 0x0002
+_INFINITE = 0xFFFFFFFF
+_WAIT_OBJECT_0 = 0
+
+
+def _create_wake_event():
+    """Create the (auto-reset) wake event; called once this instance owns the mutex."""
+    global _wake_event
+    try:
+        kernel32 = ctypes.windll.kernel32
+        kernel32.CreateEventW.restype = ctypes.wintypes.HANDLE
+        _wake_event = kernel32.CreateEventW(None, False, False, _WAKE_EVENT_NAME)
+    except Exception:
+        _wake_event = None
+
+
+def _signal_running_instance() -> bool:
+    """Ask the running instance to open its window. False if it can't be reached."""
+    try:
+        kernel32 = ctypes.windll.kernel32
+        kernel32.OpenEventW.restype = ctypes.wintypes.HANDLE
+        handle = kernel32.OpenEventW(_EVENT_MODIFY_STATE, False, _WAKE_EVENT_NAME)
+        if not handle:
+            return False
+        try:
+            return bool(kernel32.SetEvent(ctypes.wintypes.HANDLE(handle)))
+        finally:
+            kernel32.CloseHandle(ctypes.wintypes.HANDLE(handle))
+    except Exception:
+        return False
+
+
+# Titles of the app window (index.html / login.html), for re-activating it
+_APP_WINDOW_TITLES = ("Invoice Manager", "Pieslēgties — Invoice Manager")
+_SW_RESTORE = 9
+
+
+def _focus_app_window() -> bool:
+    """Bring an already open app window to the front. False if none is found.
+
+    The hidden console window shares the "Invoice Manager" title, so only
+    visible windows count.
+    """
+    try:
+        user32 = ctypes.windll.user32
+        user32.FindWindowExW.restype = ctypes.wintypes.HWND
+        user32.FindWindowExW.argtypes = [
+            ctypes.wintypes.HWND, ctypes.wintypes.HWND, ctypes.wintypes.LPCWSTR, ctypes.wintypes.LPCWSTR,
+        ]
+        for title in _APP_WINDOW_TITLES:
+            hwnd = None
+            while True:
+                hwnd = user32.FindWindowExW(None, hwnd, None, title)
+                if not hwnd:
+                    break
+                if user32.IsWindowVisible(hwnd):
+                    if user32.IsIconic(hwnd):
+                        user32.ShowWindow(hwnd, _SW_RESTORE)
+                    return bool(user32.SetForegroundWindow(hwnd))
+    except Exception:
+        pass
+    return False
+
+
+def _watch_wake_event(url: str):
+    """Open an app window each time another launch signals the wake event."""
+    kernel32 = ctypes.windll.kernel32
+    kernel32.WaitForSingleObject.argtypes = [ctypes.wintypes.HANDLE, ctypes.wintypes.DWORD]
+    while kernel32.WaitForSingleObject(_wake_event, _INFINITE) == _WAIT_OBJECT_0:
+        _open_app_window(url)
+
+
 # ── Logging is set up inside main() to avoid running in PyWebView child processes ──
 logger = logging.getLogger(__name__)
 log_dir = ''  # Will be set in main()
@@ -39,12 +119,14 @@ log_dir = ''  # Will be set in main()
 def _show_console():
     """Allocate a console for status messages."""
     try:
-        ctypes.windll.kernel32.AllocConsole()
-        # Redirect stdout/stderr to the new console
-        sys.stdout = open('CONOUT$', 'w', encoding='utf-8')
-        sys.stderr = open('CONOUT$', 'w', encoding='utf-8')
-        # Set console title
-        ctypes.windll.kernel32.SetConsoleTitleW("Invoice Manager")
+        kernel32 = ctypes.windll.kernel32
+        # Reuse a console we were started from; otherwise allocate one
+        if not kernel32.GetConsoleWindow() and not kernel32.AllocConsole():
+            return
+        kernel32.SetConsoleTitleW("Invoice Manager")
+        # One line-buffered console stream serves both stdout and stderr
+        console = open('CONOUT$', 'w', encoding='utf-8', buffering=1)
+        sys.stdout = sys.stderr = console
     except Exception:
         pass
 
@@ -70,15 +152,19 @@ def _hide_console():
 def ensure_default_user():
     """Create a default admin user if no users exist (first launch)."""
     try:
+        from sqlalchemy import inspect, select
         from app.database import SessionLocal, engine, Base
         from app.models import User
         from app.auth import get_password_hash
 
-        Base.metadata.create_all(bind=engine)
+        # First launch only; the app's own migrations handle later schema changes
+        if not inspect(engine).has_table(User.__tablename__):
+            Base.metadata.create_all(bind=engine)
         db = SessionLocal()
         try:
-            count = db.query(User).count()
-            if count == 0:
+            # Only presence matters: stop at the first row instead of counting them all
+            has_user = db.execute(select(User.id).limit(1)).first() is not None
+            if not has_user:
                 hashed = get_password_hash("admin123")
                 user = User(username="admin", password_hash=hashed, email="admin@localhost")
                 db.add(user)
@@ -86,7 +172,7 @@ def ensure_default_user():
                 print("  [OK] Izveidots noklusētais lietotājs: admin / admin123")
                 logger.info("Created default admin user (admin / admin123)")
             else:
-                print(f"  [OK] Datubāzē ir {count} lietotāj(i)")
+                print("  [OK] Lietotāji datubāzē atrasti")
         finally:
             db.close()
     except Exception as e:
@@ -94,6 +180,14 @@ def ensure_default_user():
         logger.error(f"Could not create default user: {e}")
 
 
+def _preload_app():
+    """Import app.main ahead of time; run_server imports it again if this fails."""
+    try:
+        import app.main  # noqa: F401
+    except Exception as e:
+        logger.warning(f"App preload failed, importing on server start instead: {e}")
+
+
 # ── Port helpers ─────────────────────────────────────────────────────
 
 def find_free_port(preferred: int = 8001) -> int:
@@ -109,36 +203,94 @@ def find_free_port(preferred: int = 8001) -> int:
             return port
 
 
+WAIT_POLL_MIN_DELAY = 0.02  # seconds; uvicorn is often up within tens of ms
+WAIT_POLL_MAX_DELAY = 0.5
+WAIT_PROGRESS_INTERVAL = 2.5
+
+
+# connect_ex() results meaning "connection under way" (POSIX / Windows)
+_CONNECT_PENDING = {errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, 'WSAEWOULDBLOCK', 10035)}
+
+
+def _try_connect(port: int, wait: float) -> bool:
+    """One non-blocking connect to the local server, waiting at most ``wait`` seconds.
+
+    select() returns the moment the connection completes, instead of after a
+    fixed sleep. A failed connect shows up as writable with SO_ERROR set on
+    POSIX, and in the exception set on Windows.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setblocking(False)
+        err = s.connect_ex(('127.0.0.1', port))
+        if err == 0:
+            return True
+        if err not in _CONNECT_PENDING:
+            return False
+        _, writable, failed = select.select([], [s], [s], wait)
+        return bool(writable) and not failed and s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+
+
 def wait_for_server(port: int, timeout: float = 45.0) -> bool:
-    """Block until the server is accepting connections on the given port."""
-    deadline = time.time() + timeout
-    attempt = 0
-    while time.time() < deadline:
-        attempt += 1
-        try:
-            with socket.create_connection(('127.0.0.1', port), timeout=1):
-                return True
-        except (ConnectionRefusedError, OSError):
-            if attempt % 5 == 0:
-                remaining = int(deadline - time.time())
-                print(f"  ... gaida serveri ({remaining}s atlikušas)")
-            time.sleep(0.5)
+    """Block until the server is accepting connections on the given port.
+
+    Polls quickly at first and backs off to WAIT_POLL_MAX_DELAY, so a warm
+    start is noticed almost immediately without spinning on a slow machine.
+    """
+    deadline = time.monotonic() + timeout
+    next_progress = time.monotonic() + WAIT_PROGRESS_INTERVAL
+    delay = WAIT_POLL_MIN_DELAY
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        wait = min(delay, deadline - started)
+        if _try_connect(port, wait):
+            return True
+        now = time.monotonic()
+        if now >= next_progress:
+            remaining = int(deadline - now)
+            print(f"  ... gaida serveri ({remaining}s atlikušas)")
+            next_progress = now + WAIT_PROGRESS_INTERVAL
+        # A refused connect returns early; sleep out the rest of this step
+        time.sleep(max(0.0, started + wait - now))
+        delay = min(delay * 1.5, WAIT_POLL_MAX_DELAY)
     return False
 
 
 # ── System tray ──────────────────────────────────────────────────────
 
+def _resource_path(name: str) -> str:
+    """Path of a file shipped next to launcher.py (or in the PyInstaller bundle)."""
+    return os.path.join(getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__))), name)
+
+
+def _draw_tray_icon():
+    """Draw the tray icon: 'IM' on a green rounded square (source of tray_icon.png)."""
+    from PIL import Image, ImageDraw
+
+    img = Image.new('RGB', (64, 64), '#1a1a2e')
+    draw = ImageDraw.Draw(img)
+    draw.rounded_rectangle([4, 4, 60, 60], radius=12, fill='#2ecc71')
+    draw.text((16, 18), 'IM', fill='white')
+    return img
+
+
+def _load_tray_icon():
+    """Load the pre-rendered tray icon; draw it only if the PNG is missing."""
+    from PIL import Image
+
+    try:
+        img = Image.open(_resource_path('tray_icon.png'))
+        img.load()
+        return img
+    except OSError:
+        return _draw_tray_icon()
+
+
 def run_tray(port: int, shutdown_event: threading.Event):
     """Show a system tray icon with Open / Quit actions."""
     try:
         import pystray
-        from PIL import Image, ImageDraw, ImageFont
 
-        # Create a simple icon: green circle on white bg
-        img = Image.new('RGB', (64, 64), '#1a1a2e')
-        draw = ImageDraw.Draw(img)
-        draw.rounded_rectangle([4, 4, 60, 60], radius=12, fill='#2ecc71')
-        draw.text((16, 18), 'IM', fill='white')
+        img = _load_tray_icon()
 
         def on_open(icon, item):
             _open_app_window(f"http://localhost:{port}")
@@ -178,38 +330,129 @@ def run_tray(port: int, shutdown_event: threading.Event):
 # ── Main entry point ─────────────────────────────────────────────────
 
 
+_BROWSER_CANDIDATES = (
+    # Microsoft Edge (ships with every Windows 10+)
+    r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe",
+    r"C:\Program Files\Microsoft\Edge\Application\msedge.exe",
+    # Google Chrome
+    r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+    r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+)
+_CHROMIUM_EXES = ('msedge.exe', 'chrome.exe')
+
+
+def _registered_browsers():
+    """Yield browser executables registered under StartMenuInternet (any install path)."""
+    try:
+        import winreg
+    except ImportError:
+        return
+    for root in (winreg.HKEY_LOCAL_MACHINE, winreg.HKEY_CURRENT_USER):
+        try:
+            clients = winreg.OpenKey(root, r"SOFTWARE\Clients\StartMenuInternet")
+        except OSError:
+            continue
+        with clients:
+            index = 0
+            while True:
+                try:
+                    name = winreg.EnumKey(clients, index)
+                except OSError:
+                    break
+                index += 1
+                try:
+                    command = winreg.QueryValue(clients, name + r"\shell\open\command")
+                except OSError:
+                    continue
+                yield command.strip().split('"')[1] if command.startswith('"') else command.split()[0]
+
+
+@functools.lru_cache(maxsize=1)
+def _find_app_browser():
+    """Return the path of an Edge/Chrome executable for --app mode, or None.
+
+    The result is remembered in browser.cache next to the log, so later
+    launches check that one path instead of probing every location.
+    """
+    cache_file = os.path.join(log_dir, 'browser.cache') if log_dir else ''
+    if cache_file:
+        try:
+            with open(cache_file, encoding='utf-8') as f:
+                cached = f.read().strip()
+            if cached and os.path.isfile(cached):
+                return cached
+        except OSError:
+            pass
+
+    path = next((p for p in _BROWSER_CANDIDATES if os.path.isfile(p)), None)
+    if path is None:
+        path = next(
+            (p for p in _registered_browsers()
+             if os.path.basename(p).lower() in _CHROMIUM_EXES and os.path.isfile(p)),
+            None,
+        )
+    if path and cache_file:
+        try:
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                f.write(path)
+        except OSError:
+            pass
+    return path
+
+
+# Browser processes started by _open_app_window, released again on shutdown
+_app_windows = []
+
+
+def _release_app_windows():
+    """Reap app windows that have exited and drop our handles to the rest.
+
+    The process may be the user's whole Edge/Chrome session (an --app launch
+    can hand off to it), so it is never terminated.
+    """
+    for proc in _app_windows:
+        proc.poll()
+    _app_windows.clear()
+
+
 def _open_app_window(url: str):
     """Open the app in a dedicated window using Edge/Chrome --app mode.
     This gives a native-looking window without needing pywebview or pythonnet.
     Falls back to default browser if no Chromium browser is found.
     Returns the Popen object if app mode succeeded, else None.
     """
-    candidate_paths = [
-        # Microsoft Edge (ships with every Windows 10+)
-        r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe",
-        r"C:\Program Files\Microsoft\Edge\Application\msedge.exe",
-        # Google Chrome
-        r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-        r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
-    ]
     app_args = [
         f"--app={url}",
         "--new-window",
         "--window-size=1280,800",
         "--disable-extensions",
     ]
-    for path in candidate_paths:
-        if os.path.isfile(path):
-            try:
-                proc = subprocess.Popen([path] + app_args)
-                logger.info(f"Opened app window using: {path}")
-                return proc
-            except Exception as e:
-                logger.warning(f"Failed to launch {path}: {e}")
-
-    # Fallback: open in default browser (no blocking process returned)
+    path = _find_app_browser()
+    if path:
+        try:
+            proc = subprocess.Popen(
+                [path] + app_args,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                close_fds=True,
+                # Don't share our console or Ctrl+C group with the browser
+                creationflags=getattr(subprocess, 'DETACHED_PROCESS', 0)
+                | getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0),
+            )
+            _app_windows.append(proc)
+            logger.info(f"Opened app window using: {path}")
+            return proc
+        except Exception as e:
+            logger.warning(f"Failed to launch {path}: {e}")
+
+    # Fallback: open in default browser (no blocking process returned).
+    # os.startfile hands the URL straight to the shell on Windows.
     logger.warning("No Chromium browser found — falling back to default browser")
-    webbrowser.open(url)
+    if hasattr(os, 'startfile'):
+        os.startfile(url)
+    else:
+        webbrowser.open(url)
     return None
 
 
@@ -227,6 +470,11 @@ def main():
     print(f"  [1/3] Startē serveri uz porta {port}...")
     logger.info(f"Starting Invoice Manager on port {port}")
 
+    # Import the web app (FastAPI, routers, ReportLab setup, ...) in the
+    # background while the database is checked; run_server waits for it
+    preload = threading.Thread(target=_preload_app, daemon=True)
+    preload.start()
+
     # Make sure the default admin user exists
     print("  [2/3] Pārbauda datubāzi...")
     ensure_default_user()
@@ -239,17 +487,31 @@ def main():
         try:
             import traceback
             import uvicorn
+            preload.join()
             from app.main import app as fastapi_app
+
+            class LauncherServer(uvicorn.Server):
+                """uvicorn.Server that remembers the event loop it serves on,
+                so the main thread can schedule the shutdown onto that loop."""
+                loop = None
+
+                async def serve(self, sockets=None):
+                    self.loop = asyncio.get_running_loop()
+                    await super().serve(sockets=sockets)
+
             config = uvicorn.Config(
                 fastapi_app,
                 host="127.0.0.1",
                 port=port,
                 log_level="info",
+                # Don't wait on idle keep-alive connections from the app
+                # window past this when quitting
+                timeout_graceful_shutdown=3,
                 # Force logs to stderr so we can capture them
                 # access_log=True,
                 # use_colors=False
             )
-            server = uvicorn.Server(config)
+            server = LauncherServer(config)
             run_server.uvicorn_server = server
             server.run()
         except Exception as e:
@@ -272,6 +534,8 @@ def main():
 
         url = f"http://localhost:{port}"
         _open_app_window(url)
+        if _wake_event:
+            threading.Thread(target=_watch_wake_event, args=(url,), daemon=True).start()
 
         # Always run the system tray so the user can quit the server cleanly.
         # The server stays alive until the user chooses "Aizvērt" from the tray.
@@ -291,11 +555,17 @@ def main():
     # Graceful shutdown
     print("\n  Izslēdz serveri...")
     logger.info("Shutting down…")
-    if hasattr(run_server, 'uvicorn_server'):
-        run_server.uvicorn_server.should_exit = True
+    server = getattr(run_server, 'uvicorn_server', None)
+    if server is not None and server.loop is not None:
+        # should_exit is read by the server's loop; set it from that loop
+        try:
+            server.loop.call_soon_threadsafe(setattr, server, 'should_exit', True)
+        except RuntimeError:
+            pass  # loop already closed: the server has stopped on its own
 
     # Give server time to clean up
     server_thread.join(timeout=5)
+    _release_app_windows()
     logger.info("Goodbye!")
 
 
@@ -319,7 +589,10 @@ if __name__ == "__main__":
     # ── Mutex check (only in the main process) ──
     if not _acquire_mutex():
         print('  [!] Invoice Manager jau darbojas!')
-        _open_app_window('http://localhost:8001')
+        # Cheapest first: focus the open window, else ask the instance for one
+        if not _focus_app_window() and not _signal_running_instance():
+            _open_app_window('http://localhost:8001')
         sys.exit(0)
+    _create_wake_event()
 
     main()
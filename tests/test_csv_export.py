@@ -0,0 +1,52 @@
+"""Hand-formatted CSV export rows against the csv module."""
+
+import csv
+import io
+from datetime import date
+
+import pytest
+
+from app.routers import invoices
+
+
+def _csv_writer_row(*fields) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(fields)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("value", [
+    "SIA Klients",
+    "Klients, SIA",
+    'SIA "Klients"',
+    '"',
+    "Rindas\nbeigas",
+    "Rindas\r\nbeigas",
+    "Atgriezt\r",
+    ' atstarpes ',
+    "Ķekava; Rīga",
+])
+def test_csv_field_matches_csv_writer(value):
+    assert invoices._csv_field(value) + "\r\n" == _csv_writer_row(value)
+
+
+# An invoice without a client leaves the field empty
+@pytest.mark.parametrize("client_name", ['SIA "A, B"\nfiliāle', ""])
+def test_csv_row_template_matches_csv_writer(client_name):
+    issued, due = date(2026, 1, 5), date(2026, 10, 15)
+    row = invoices.CSV_ROW_TEMPLATE % (
+        invoices._csv_field("NC-000001"),
+        invoices._csv_field(client_name),
+        issued.day, issued.month, issued.year,
+        due.day, due.month, due.year,
+        1234.5, 259.25, 1493.75,
+        invoices._csv_field("sent"),
+    )
+    assert row == _csv_writer_row(
+        "NC-000001", client_name, "05.01.2026", "15.10.2026",
+        "1234.50", "259.25", "1493.75", "sent",
+    )
+
+
+def test_csv_header_matches_csv_writer():
+    assert invoices.CSV_HEADER_BYTES == _csv_writer_row(*invoices.CSV_HEADER).encode("utf-8")
@@ -0,0 +1,52 @@
+"""Latvian sum-in-words, as printed on every invoice."""
+
+import pytest
+
+from app import utils
+
+
+@pytest.mark.parametrize("n, words", [
+    (0, "nulle"),
+    (1, "viens"),
+    (11, "vienpadsmit"),
+    (21, "divdesmit viens"),
+    (100, "simts"),
+    (101, "simt viens"),
+    (120, "simt divdesmit"),
+    (999, "deviņsimt deviņdesmit deviņi"),
+    # Thousands: "tūkstotis" only for exactly one, genitive for 11-19 and round tens
+    (1000, "viens tūkstotis"),
+    (1120, "viens tūkstotis simt divdesmit"),
+    (2000, "divi tūkstoši"),
+    (10000, "desmit tūkstošu"),
+    (11000, "vienpadsmit tūkstošu"),
+    (21000, "divdesmit viens tūkstoši"),
+    (100000, "simts tūkstošu"),
+    (111000, "simt vienpadsmit tūkstošu"),
+    (121000, "simt divdesmit viens tūkstoši"),
+    (999999, "deviņsimt deviņdesmit deviņi tūkstoši deviņsimt deviņdesmit deviņi"),
+    # Millions: singular for any count ending in 1 (except 11)
+    (1000000, "viens miljons"),
+    (1000001, "viens miljons viens"),
+    (2000000, "divi miljoni"),
+    (10000000, "desmit miljonu"),
+    (11000000, "vienpadsmit miljonu"),
+    (21000000, "divdesmit viens miljons"),
+    (121000000, "simt divdesmit viens miljons"),
+    (999999999, "deviņsimt deviņdesmit deviņi miljoni deviņsimt deviņdesmit deviņi "
+                "tūkstoši deviņsimt deviņdesmit deviņi"),
+])
+def test_int_to_words(n, words):
+    assert utils._int_to_words(n) == words
+
+
+@pytest.mark.parametrize("amount, words", [
+    (0.01, "Nulle eiro un 01 cents"),
+    (1.0, "Viens eiro un 00 centi"),
+    (12.34, "Divpadsmit eiro un 34 centi"),
+    (1120.0, "Viens tūkstotis simt divdesmit eiro un 00 centi"),
+    (1234567.89, "Viens miljons divsimt trīsdesmit četri tūkstoši piecsimt sešdesmit "
+                 "septiņi eiro un 89 centi"),
+])
+def test_number_to_words_lv(amount, words):
+    assert utils.number_to_words_lv(amount) == words
@@ -0,0 +1,61 @@
+"""Bulk PDF rendering in worker processes."""
+
+import multiprocessing
+import os
+import shutil
+from datetime import date
+
+import pytest
+import reportlab
+
+from app import models, utils
+
+
+@pytest.fixture
+def pdf_fonts(tmp_path, monkeypatch):
+    """Stand ReportLab's bundled Vera fonts in for Arial.
+
+    The PDF styles always name CustomArial / CustomArialBold, which
+    _ensure_fonts registers from arial.ttf / arialbd.ttf. Workers register
+    them in their own process, so the files go where _find_font looks
+    (WINDIR/Fonts, inherited by the workers) rather than being registered
+    only in this one.
+    """
+    bundled = os.path.join(os.path.dirname(reportlab.__file__), "fonts")
+    fonts_dir = tmp_path / "Fonts"
+    fonts_dir.mkdir()
+    shutil.copy(os.path.join(bundled, "Vera.ttf"), fonts_dir / "arial.ttf")
+    shutil.copy(os.path.join(bundled, "VeraBd.ttf"), fonts_dir / "arialbd.ttf")
+    monkeypatch.setenv("WINDIR", str(tmp_path))
+    utils._find_font.cache_clear()
+    utils._ensure_fonts.cache_clear()
+    yield
+    utils._find_font.cache_clear()
+    utils._ensure_fonts.cache_clear()
+
+
+def _invoice(n: int) -> models.Invoice:
+    invoice = models.Invoice(
+        id=n, invoice_number=f"NC-{n:06d}", client_id=1, status="sent",
+        date=date(2026, 10, 1), due_date=date(2026, 10, 15), issuer_name="", notes="",
+    )
+    invoice.client = models.Client(id=1, name="SIA Klients", reg_number="40003000000")
+    invoice.items = [
+        models.InvoiceItem(id=n, invoice_id=n, description=f"Pakalpojums {n}", unit="gab.",
+                           quantity=n, unit_price=12.5, vat_rate=21)
+    ]
+    return invoice
+
+
+def test_bulk_render_under_spawn(pdf_fonts):
+    # spawn is the only start method on Windows: workers re-import app.utils from scratch
+    invoices = [_invoice(n) for n in range(1, utils.PDF_BULK_MIN_BATCH + 2)]
+    utils._pdf_cache.clear()
+
+    pdfs = list(utils.generate_invoices_pdf_bulk(
+        invoices, {"company_name": "ACME"}, workers=2,
+        mp_context=multiprocessing.get_context("spawn"),
+    ))
+
+    assert len(pdfs) == len(invoices)
+    assert all(pdf is not None and pdf.startswith(b"%PDF") for pdf in pdfs)